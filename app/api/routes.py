@@ -1,136 +1,141 @@
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, Response, current_app, request, jsonify, render_template, stream_with_context
 from werkzeug.utils import secure_filename
-import os
-from PyPDF2 import PdfReader
-from app.config import UPLOAD_FOLDER, ALLOWED_EXTENSIONS, SHOW_DEBUG_WINDOW
-from app.core.document_processor import DocumentProcessor
-from app.core.embeddings import EmbeddingGenerator
-from app.core.query_engine import QueryEngine
-from app.storage.faiss_client import FAISSClient
-from app.storage.elasticsearch_client import ElasticsearchClient
+import json
+import logging
+import uuid
+from pathlib import Path
+from app.config import ALLOWED_EXTENSIONS, SHOW_DEBUG_WINDOW
+from app import services
+from app.core.llm_client import LLMBusyError
+from app.utils import metrics, tracing
 
 api = Blueprint('api', __name__, url_prefix='/api')
-document_processor = DocumentProcessor()
-embedding_generator = EmbeddingGenerator()
-query_engine = QueryEngine()
-faiss_client = FAISSClient()
-es_client = ElasticsearchClient()
+logger = logging.getLogger(__name__)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def read_file_content(file):
-    """Read content from either text or PDF files"""
-    filename = file.filename.lower()
-    if filename.endswith('.pdf'):
-        # Handle PDF files
-        try:
-            pdf_reader = PdfReader(file)
-            content = []
-            for page in pdf_reader.pages:
-                content.append(page.extract_text())
-            return '\n'.join(content)
-        except Exception as e:
-            print(f"PDF reading error: {e}")
-            raise
-    else:
-        # Handle text files
-        return file.read().decode('utf-8')
-
 @api.route('/')
 def index():
     return render_template('index.html', config={'SHOW_DEBUG_WINDOW': SHOW_DEBUG_WINDOW})
 
 @api.route('/upload', methods=['POST'])
 def upload_file():
-    print("\n=== Starting Upload Process ===")
-    print("Upload endpoint called!")
-    
     if 'file' not in request.files:
-        print("No file in request")
         return jsonify({'error': 'No file part'}), 400
         
     file = request.files['file']
     if file.filename == '':
-        print("No selected file")
         return jsonify({'error': 'No selected file'}), 400
         
     if file and allowed_file(file.filename):
         try:
-            print(f"\n1. Processing file: {file.filename}")
-            
-            # Read content with more detailed logging
-            print("   Starting content extraction...")
-            content = read_file_content(file)
-            print(f"2. Content extracted - Length: {len(content)} characters")
-            print(f"   First 100 chars: {content[:100]}...")
-            
-            # Add logging before chunking
-            print("\n   Starting text chunking...")
-            try:
-                chunks = document_processor.chunk_text(content)
-                print(f"3. Text chunked into {len(chunks)} parts")
-                print(f"   First chunk sample: {chunks[0][:100]}...")
-            except Exception as e:
-                print(f"!!! Error during chunking: {str(e)}")
-                raise
+            # Store the upload and hand it to the background ingest workers
+            path = Path(current_app.config['UPLOAD_FOLDER']) / f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+            file.save(path)
+            job = services.ingest_queue().submit(file.filename, path)
+            logger.info("Queued ingest job %s for %s", job['id'], file.filename)
             
-            # Add logging before embedding generation
-            print("\n   Starting embedding generation...")
-            try:
-                embeddings = embedding_generator.generate_embeddings(chunks)
-                print(f"4. Created {len(embeddings)} embeddings")
-            except Exception as e:
-                print(f"!!! Error during embedding generation: {str(e)}")
-                raise
-            
-            print("\n5. Starting indexing process...")
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                try:
-                    print(f"\n   Processing chunk {i+1}/{len(chunks)}")
-                    
-                    print("   - Adding to FAISS...")
-                    faiss_client.add_embeddings(embedding.reshape(1, -1))
-                    print(f"   - Added to FAISS successfully")
-                    
-                    print("   - Adding to Elasticsearch...")
-                    doc_id = f"{file.filename}_{i}"
-                    es_client.index_document(
-                        doc_id=doc_id,
-                        content=chunk,
-                        metadata={'source': file.filename},
-                        embedding_id=i
-                    )
-                    print(f"   - Added to Elasticsearch with ID: {doc_id}")
-                except Exception as e:
-                    print(f"!!! Error processing chunk {i}: {str(e)}")
-                    raise
-            
-            print("\n=== Upload Complete ===")
-            return jsonify({'message': f'Document uploaded: {file.filename}'}), 200
+            return jsonify({
+                'message': f'Document queued for indexing: {file.filename}',
+                'job_id': job['id'],
+                'status_url': f"/api/jobs/{job['id']}"
+            }), 202
             
         except Exception as e:
-            print(f"\n!!! Upload error: {str(e)}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
+            logger.exception("Upload of %s failed", file.filename)
             return jsonify({'error': str(e)}), 500
             
     return jsonify({'error': 'Invalid file type'}), 400
 
+@api.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = services.ingest_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    job.pop('path', None)
+    return jsonify(job), 200
+
+@api.route('/cache/stats')
+def cache_stats():
+    semantic_cache = services.semantic_cache()
+    return jsonify({'semantic_cache': semantic_cache.stats() if semantic_cache else None}), 200
+
+@api.route('/embeddings/stats')
+def embedding_stats():
+    cache = services.embedding_generator().cache
+    return jsonify({
+        'query_batching': services.embedding_batcher().stats(),
+        'cache': cache.stats() if cache else None
+    }), 200
+
+@api.route('/llm/stats')
+def llm_stats():
+    return jsonify(services.llm_client().stats()), 200
+
 @api.route('/query', methods=['POST'])
 def query_documents():
-    print("Query endpoint called!")
+    """Answer a query. With ``"timings": true`` the response includes per-stage timings (ms)."""
     data = request.get_json()
     
     if not data or 'query' not in data:
         return jsonify({'error': 'No query provided'}), 400
     
     try:
-        result = query_engine.query(data['query'])
+        with tracing.trace() as trace:
+            result = services.query_engine().query(
+                data['query'],
+                nprobe=data.get('nprobe'),
+                ef_search=data.get('ef_search')
+            )
+        if data.get('timings'):
+            result = {**result, 'timings': trace.as_millis()}
         return jsonify(result), 200
+    except LLMBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
-        print(f"Query error: {e}")
+        logger.exception("Query failed")
         return jsonify({
             'error': str(e),
             'debug_logs': [f"🔴 Backend: Error in query endpoint: {str(e)}"]
-        }), 500 
\ No newline at end of file
+        }), 500
+
+@api.route('/query/stream', methods=['POST'])
+def query_documents_stream():
+    """Stream the answer as Server-Sent Events: token events, then a final done event.
+
+    With ``"timings": true`` the done event includes per-stage timings (ms).
+    """
+    data = request.get_json()
+    
+    if not data or 'query' not in data:
+        return jsonify({'error': 'No query provided'}), 400
+    
+    query_engine = services.query_engine()
+    
+    def generate():
+        try:
+            with tracing.trace() as trace:
+                events = query_engine.query_stream(
+                    data['query'],
+                    nprobe=data.get('nprobe'),
+                    ef_search=data.get('ef_search')
+                )
+                for event in events:
+                    if event.get('done') and data.get('timings'):
+                        event = {**event, 'timings': trace.as_millis()}
+                    yield f"data: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logger.exception("Query stream failed")
+            yield f"data: {json.dumps({'error': str(e), 'done': True})}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api.route('/metrics')
+def prometheus_metrics():
+    """Stage latency histograms, queue and cache metrics in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -7,6 +7,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Storage paths
 STORAGE_DIR = BASE_DIR / "storage"
 FAISS_INDEX_PATH = STORAGE_DIR / "faiss_index"
+FAISS_WAL_PATH = STORAGE_DIR / "faiss_index.wal"
+CHUNK_STORE_PATH = STORAGE_DIR / "chunks.sqlite3"
 DOCUMENT_STORE_PATH = STORAGE_DIR / "documents"
 
 # Create storage directories if they don't exist
@@ -15,8 +17,28 @@ DOCUMENT_STORE_PATH.mkdir(exist_ok=True)
 
 # Model configurations
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
-CHUNK_SIZE = 500
-CHUNK_OVERLAP = 50
+EMBEDDING_BACKEND = "torch"  # "torch", "torch-int8", "onnx" or "onnx-int8" (int8 = dynamic quantization)
+EMBEDDING_THREADS = os.cpu_count() or 1  # Intra-op threads for embedding inference, split among SERVER_WORKERS
+EMBEDDING_ONNX_DIR = STORAGE_DIR / "onnx"  # Exported (and quantized) ONNX models, created on first use
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_DIR = STORAGE_DIR / "embedding_cache"
+EMBEDDING_CACHE_LRU_SIZE = 50000  # Embeddings kept in memory per process
+EMBEDDING_CACHE_MAX_BYTES = 2 * 1024 ** 3  # The disk store stops growing at this size
+CHUNK_MAX_TOKENS = 254  # MiniLM's 256-token input limit minus [CLS]/[SEP]
+CHUNK_OVERLAP_TOKENS = 32  # Trailing sentences (up to this many tokens) repeated in the next chunk
+
+# FAISS index configuration
+FAISS_INDEX_TYPE = "flat"  # "flat" (exact search), "hnsw" or "ivfpq" (approximate search)
+FAISS_HNSW_M = 32  # Graph neighbours per node
+FAISS_HNSW_EF_CONSTRUCTION = 80
+FAISS_HNSW_EF_SEARCH = 64  # Default search depth, can be overridden per query
+FAISS_HNSW_MAX_DEAD_FRACTION = 0.2  # Share of removed (tombstoned) nodes that triggers a graph rebuild
+FAISS_IVF_NLIST = 1024  # Number of inverted lists (coarse clusters)
+FAISS_IVF_NPROBE = 16  # Default lists visited per query, can be overridden per query
+FAISS_PQ_M = 48  # PQ sub-quantizers, must divide the embedding dimension (384)
+FAISS_PQ_NBITS = 8
+FAISS_IVF_MIN_TRAIN_SIZE = 39 * FAISS_IVF_NLIST  # Vectors needed before the flat index migrates to IVF-PQ
+FAISS_IVF_MAX_TRAIN_SIZE = 256 * FAISS_IVF_NLIST  # Training sample cap
 
 # Elasticsearch configuration
 ELASTICSEARCH_HOST = "localhost"
@@ -27,12 +49,73 @@ ELASTICSEARCH_INDEX = "documents"
 REDIS_HOST = "localhost"
 REDIS_PORT = 6379
 REDIS_DB = 0
+CACHE_TTL = 24 * 3600  # Seconds; answers are also invalidated whenever the corpus changes
+CACHE_COMPRESS_MIN_BYTES = 1024  # Cached values at least this large are zlib-compressed
+
+# LLM configuration
+OLLAMA_URL = "http://localhost:11434/api/generate"
+LLM_MODEL = "mistral"
+LLM_TIMEOUT = (5, 300)  # (connect, read) seconds for Ollama requests
+LLM_MAX_CONCURRENCY = 2  # Generations sent to Ollama at once across all workers (match OLLAMA_NUM_PARALLEL)
+LLM_QUEUE_TIMEOUT = 60.0  # Seconds a generation may wait for a slot before the request fails
+LLM_KEEP_ALIVE = "30m"  # How long Ollama keeps the model (and its prompt-prefix KV cache) loaded
+
+# Query pipeline
+QUERY_WORKERS = 8  # Threads running cache lookup, BM25 and vector search concurrently
+QUERY_CACHE_TIMEOUT = 0.5  # Seconds; a slow cache counts as a miss
+QUERY_VECTOR_TIMEOUT = 5.0  # Seconds for embedding + FAISS search + chunk lookup
+QUERY_BM25_TIMEOUT = 5.0
+QUERY_EMBED_BATCH_WINDOW = 0.003  # Seconds concurrent query embeddings are collected into one batch
+QUERY_EMBED_MAX_BATCH = 32  # A batch is encoded as soon as this many queries wait
+
+# Hybrid retrieval
+VECTOR_CANDIDATES = 20  # FAISS hits considered per query
+BM25_CANDIDATES = 20  # Elasticsearch BM25 hits considered per query
+FUSION_METHOD = "rrf"  # "rrf" (reciprocal-rank fusion) or "weighted" (min-max normalized scores)
+FUSION_WEIGHTS = {'vector': 1.0, 'bm25': 1.0}
+RRF_K = 60
+CONTEXT_CANDIDATES = 8  # Fused chunks considered for the LLM context
+CONTEXT_TOKEN_BUDGET = 768  # Context tokens (embedding tokenizer) passed to the LLM
+CONTEXT_PASSAGE_TOKENS = 256  # Tokens kept from a single passage
+CONTEXT_DEDUP_THRESHOLD = 0.92  # Sentences this similar to one already in the context are dropped
+
+# Semantic query cache
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_THRESHOLD = 0.95  # Minimum cosine similarity for a paraphrase to reuse an answer
+SEMANTIC_CACHE_MAX_ENTRIES = 10000
+
+# Ingestion configuration
+EMBED_BATCH_SIZE = 64  # Chunks embedded per model call while pages are still being extracted
+PDF_PARALLEL_MIN_PAGES = 50  # PDFs with at least this many pages are extracted in a process pool
+PDF_EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+PDF_PAGES_PER_TASK = 8
+INGEST_QUEUE_BACKEND = "redis"  # "redis" (shared across processes) or "memory"; falls back to memory
+INGEST_WORKERS = 2  # Background ingestion threads per process
+INGEST_JOB_TTL = 24 * 3600  # Seconds job status stays queryable
+INGEST_JOB_LEASE = 300  # Seconds without progress after which a running job counts as abandoned
+ES_BULK_BATCH_SIZE = 500  # Chunks per Elasticsearch _bulk request
+FAISS_SNAPSHOT_INTERVAL = 300  # Seconds between background index snapshots (0 disables the timer)
+FAISS_WAL_MAX_BYTES = 256 * 1024 * 1024  # Write-ahead log size that triggers an immediate snapshot
+FAISS_RELOAD_POLL_INTERVAL = 5.0  # Seconds between snapshot and log checks in read-only serving processes
 
 # Flask configuration
 UPLOAD_FOLDER = STORAGE_DIR / "uploads"
+UPLOAD_FOLDER.mkdir(exist_ok=True)
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx'}
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size 
+WARM_UP_ON_STARTUP = True  # Load the model, index and clients before serving the first request
+
+# Production serving (gunicorn -c gunicorn.conf.py)
+SERVER_BIND = "0.0.0.0:5000"
+SERVER_WORKERS = os.cpu_count() or 1  # Processes; one of them is the index writer
+SERVER_THREADS = 4  # Request threads per process
+SERVER_TIMEOUT = 300  # Seconds; long enough for a streamed LLM answer
+WRITER_LOCK_PATH = STORAGE_DIR / "writer.lock"
+LLM_SLOTS_DIR = STORAGE_DIR / "llm_slots"  # Lock files sharing LLM_MAX_CONCURRENCY between workers
+METRICS_DIR = STORAGE_DIR / "metrics"  # Per-worker metric files merged by /api/metrics
+METRICS_SHARE_INTERVAL = 5.0  # Seconds between a worker's metric file updates
 
 # Debug settings
 DEBUG_MODE = True  # Set to False in production
-SHOW_DEBUG_WINDOW = True  # Toggle debug window in UI
\ No newline at end of file
+SHOW_DEBUG_WINDOW = True  # Toggle debug window in UI
+LOG_LEVEL = "INFO"  # "DEBUG" also logs every pipeline step and stage timing
\ No newline at end of file
@@ -0,0 +1,78 @@
+import re
+from collections import deque
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+from app.config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+
+class TokenChunker:
+    """Sentence-aligned chunker that sizes chunks in model tokens.
+
+    Chunks hold whole sentences and at most ``max_tokens`` tokens, so they fit
+    the embedding model's sequence limit without silent truncation. Each chunk
+    starts with the trailing sentences of the previous one, up to
+    ``overlap_tokens`` tokens. Every sentence is tokenized once and enters and
+    leaves the sliding window once, so chunking is a single O(n) pass.
+
+    ``tokenizer`` is a Hugging Face fast tokenizer (e.g. the embedding model's
+    own); without one, words and punctuation are counted as tokens.
+    """
+
+    def __init__(self, tokenizer=None, max_tokens: int = CHUNK_MAX_TOKENS,
+                 overlap_tokens: int = CHUNK_OVERLAP_TOKENS, batch_size: int = 256):
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be at least 0 and smaller than max_tokens")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.batch_size = batch_size
+
+    def chunks(self, sentences: Iterable[str]) -> Iterator[str]:
+        """Yield chunks from a (possibly unbounded) stream of sentences."""
+        window = deque()  # (sentence, token count) pairs of the chunk being built
+        window_tokens = 0
+
+        for sentence, tokens in self._pieces(sentences):
+            if window and window_tokens + tokens > self.max_tokens:
+                yield " ".join(text for text, _ in window)
+                # Keep the trailing sentences that fit the overlap (and leave room for this one)
+                limit = min(self.overlap_tokens, self.max_tokens - tokens)
+                while window and window_tokens > limit:
+                    window_tokens -= window.popleft()[1]
+            window.append((sentence, tokens))
+            window_tokens += tokens
+
+        if window:
+            yield " ".join(text for text, _ in window)
+
+    def _pieces(self, sentences: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        """Yield (text, token count) per sentence, splitting sentences longer than a chunk."""
+        iterator = (sentence.strip() for sentence in sentences)
+        iterator = (sentence for sentence in iterator if sentence)
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            for sentence, tokens in zip(batch, self.count_tokens(batch)):
+                if tokens <= self.max_tokens:
+                    yield sentence, tokens
+                else:
+                    yield from self._split(sentence)
+
+    def count_tokens(self, batch: List[str]) -> List[int]:
+        """Token count of each text."""
+        if self.tokenizer is None:
+            return [len(_WORD.findall(sentence)) for sentence in batch]
+        return [len(ids) for ids in self.tokenizer(batch, add_special_tokens=False)['input_ids']]
+
+    def _split(self, sentence: str) -> Iterator[Tuple[str, int]]:
+        """Cut an oversized sentence at token boundaries into pieces of at most max_tokens."""
+        if self.tokenizer is None:
+            offsets = [match.span() for match in _WORD.finditer(sentence)]
+        else:
+            offsets = self.tokenizer(sentence, add_special_tokens=False,
+                                     return_offsets_mapping=True)['offset_mapping']
+        for start in range(0, len(offsets), self.max_tokens):
+            piece = offsets[start:start + self.max_tokens]
+            yield sentence[piece[0][0]:piece[-1][1]], len(piece)
@@ -0,0 +1,128 @@
+import numpy as np
+from typing import Dict, List
+from nltk.tokenize import sent_tokenize
+from app.config import CONTEXT_TOKEN_BUDGET, CONTEXT_PASSAGE_TOKENS, CONTEXT_DEDUP_THRESHOLD
+from app.core.chunker import TokenChunker
+from app.core.document_processor import ensure_sentence_tokenizer
+from app.core.embedding_batcher import EmbeddingBatcher
+from app.core.embeddings import EmbeddingGenerator
+
+# Identical for every request, so Ollama can reuse its KV cache for this prefix
+PROMPT_PREFIX = (
+    "Answer the question using only the retrieved information below. "
+    "If it does not answer the question, say \"I don’t know based on the given information.\"\n\n"
+    "Retrieved information:\n"
+)
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype='float32')
+    return vectors / np.clip(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12, None)
+
+class ContextBuilder:
+    """Builds the LLM prompt from retrieved passages within a token budget.
+
+    Passages that fit ``token_budget`` together are used whole. Otherwise
+    they are taken best first, each trimmed to the sentences most similar
+    to the query (at most ``passage_tokens`` tokens, kept in their original
+    order), and sentences that repeat one already selected (the overlap
+    between neighbouring chunks, boilerplate) are dropped, until
+    ``token_budget`` tokens are used. Only passages that can still fit are
+    embedded, through the ``embedding_batcher`` when given (at a lower
+    priority than queries), and bypassing the embedding cache, which would
+    otherwise fill up with one-off sentences.
+    """
+
+    def __init__(self, embedding_generator: EmbeddingGenerator, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 passage_tokens: int = CONTEXT_PASSAGE_TOKENS, dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+                 embedding_batcher: EmbeddingBatcher = None):
+        ensure_sentence_tokenizer()
+        self.embedding_generator = embedding_generator
+        self.embedding_batcher = embedding_batcher
+        self.counter = TokenChunker(embedding_generator.tokenizer)
+        self.token_budget = token_budget
+        self.passage_tokens = passage_tokens
+        self.dedup_threshold = dedup_threshold
+
+    def build(self, query_text: str, query_embedding, passages: List[str]) -> Dict:
+        """Select context for the query from best-first passages.
+
+        Returns ``{'prompt', 'passages', 'tokens'}`` where ``passages`` holds
+        the index (into ``passages``) and trimmed text of every passage used.
+        """
+        sentences = [sent_tokenize(passage) for passage in passages]
+        flat = [sentence for passage in sentences for sentence in passage]
+        if not flat:
+            return {'prompt': self.prompt(query_text, []), 'passages': [], 'tokens': 0}
+
+        tokens = self.counter.count_tokens(flat)
+        if sum(tokens) <= self.token_budget:
+            context = [{'index': index, 'text': passage} for index, passage in enumerate(passages) if sentences[index]]
+            return {
+                'prompt': self.prompt(query_text, [passage['text'] for passage in context]),
+                'passages': context,
+                'tokens': sum(tokens)
+            }
+
+        bounds = []  # Positions in flat of each passage's sentences
+        start = 0
+        for passage in sentences:
+            bounds.append(range(start, start + len(passage)))
+            start += len(passage)
+        # The most tokens each passage can contribute
+        capped = [min(sum(tokens[p] for p in positions), self.passage_tokens) for positions in bounds]
+        if query_embedding is None:
+            query_embedding = self._embed_query(query_text)
+        query_embedding = _unit(query_embedding)
+
+        embeddings = []  # Unit embeddings of flat[:len(embeddings)]
+        selected = []  # Embeddings of sentences already in the context
+        used = 0
+        context = []
+        for index, positions in enumerate(bounds):
+            if not positions or min(tokens[p] for p in positions) > self.token_budget - used:
+                continue  # Not even its shortest sentence fits
+            if positions.stop > len(embeddings):
+                # Embed, in one call, this and the following passages that can still fit
+                end, expected = index, 0
+                while end < len(bounds) and expected < self.token_budget - used:
+                    expected += capped[end]
+                    end += 1
+                embeddings.extend(_unit(self._embed(flat[len(embeddings):bounds[end - 1].stop])))
+            similarity = {p: float(embeddings[p] @ query_embedding) for p in positions}
+            keep = []
+            passage_used = 0
+            for position in sorted(positions, key=similarity.get, reverse=True):
+                if passage_used + tokens[position] > self.passage_tokens or used + tokens[position] > self.token_budget:
+                    continue
+                if selected and float(np.max(np.stack(selected) @ embeddings[position])) >= self.dedup_threshold:
+                    continue
+                keep.append(position)
+                selected.append(embeddings[position])
+                passage_used += tokens[position]
+                used += tokens[position]
+            if keep:
+                context.append({'index': index, 'text': " ".join(flat[p] for p in sorted(keep))})
+            if used >= self.token_budget:
+                break
+
+        return {
+            'prompt': self.prompt(query_text, [passage['text'] for passage in context]),
+            'passages': context,
+            'tokens': used
+        }
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if self.embedding_batcher is not None:
+            return self.embedding_batcher.embed_many(texts, use_cache=False)
+        return self.embedding_generator.generate_embeddings(texts, use_cache=False)
+
+    def _embed_query(self, query_text: str) -> np.ndarray:
+        if self.embedding_batcher is not None:
+            return self.embedding_batcher.embed(query_text)
+        return self.embedding_generator.generate_embedding(query_text)
+
+    @staticmethod
+    def prompt(query_text: str, passages: List[str]) -> str:
+        """Static instructions first, then the context, then the question."""
+        context = "\n\n".join(passages)
+        return f"{PROMPT_PREFIX}{context}\n\nQuestion: {query_text}\nAnswer:"
@@ -1,17 +1,98 @@
 import PyPDF2
+import io
+import multiprocessing
 from bs4 import BeautifulSoup
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
 import magic
-from app.config import CHUNK_SIZE, CHUNK_OVERLAP
+from app.config import PDF_PARALLEL_MIN_PAGES, PDF_EXTRACT_WORKERS, PDF_PAGES_PER_TASK
+from app.core.chunker import TokenChunker
 import nltk
-nltk.download('punkt_tab')  # Ensure sentence tokenizer is downloaded
 from nltk.tokenize import sent_tokenize
 
+_tokenizer_checked = False
+_worker_reader = None  # PdfReader opened once per extraction worker process
+
+def ensure_sentence_tokenizer():
+    """Download the punkt sentence tokenizer on first use if it is not installed yet."""
+    global _tokenizer_checked
+    if _tokenizer_checked:
+        return
+    try:
+        nltk.data.find('tokenizers/punkt_tab')
+    except LookupError:
+        nltk.download('punkt_tab')
+    _tokenizer_checked = True
+
+def _extract_page(reader: PyPDF2.PdfReader, page_number: int) -> str:
+    try:
+        return reader.pages[page_number].extract_text() or ""
+    except Exception as e:
+        raise ValueError(f"Could not extract text from page {page_number + 1}: {e}") from None
+
+def _init_extract_worker(data: bytes):
+    global _worker_reader
+    _worker_reader = PyPDF2.PdfReader(io.BytesIO(data))
+
+def _extract_page_range(start: int, end: int) -> List[str]:
+    return [_extract_page(_worker_reader, page_number) for page_number in range(start, end)]
+
+def iter_pdf_pages(data: bytes, progress: Optional[Callable[[int, int], None]] = None,
+                   workers: int = PDF_EXTRACT_WORKERS) -> Iterator[str]:
+    """Yield the text of each PDF page in order, as soon as it is extracted.
+
+    PDFs with at least ``PDF_PARALLEL_MIN_PAGES`` pages are extracted by a
+    process pool, ``PDF_PAGES_PER_TASK`` pages per task, with only a few
+    tasks in flight per worker so memory stays bounded. ``progress`` is called
+    with (pages done, total pages). A page that cannot be extracted raises
+    ``ValueError`` naming the page, after the pool has been shut down.
+    """
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    total = len(reader.pages)
+
+    if total < PDF_PARALLEL_MIN_PAGES or workers <= 1:
+        for page_number in range(total):
+            yield _extract_page(reader, page_number)
+            if progress:
+                progress(page_number + 1, total)
+        return
+
+    # Spawned (not forked) workers: the parent holds FAISS/OpenMP and request threads
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_extract_worker,
+        initargs=(data,)
+    )
+    try:
+        ranges = iter(range(0, total, PDF_PAGES_PER_TASK))
+        in_flight = deque()
+
+        def submit_next():
+            start = next(ranges, None)
+            if start is not None:
+                in_flight.append(executor.submit(_extract_page_range, start, min(start + PDF_PAGES_PER_TASK, total)))
+
+        for _ in range(workers * 2):
+            submit_next()
+        done = 0
+        while in_flight:
+            pages = in_flight.popleft().result()
+            submit_next()
+            for text in pages:
+                yield text
+            done += len(pages)
+            if progress:
+                progress(done, total)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
 class DocumentProcessor:
-    def __init__(self, chunk_size=1000, overlap=100):
-        self.chunk_size = chunk_size
-        self.overlap = overlap
+    def __init__(self, chunker: TokenChunker = None):
+        self.chunker = chunker or TokenChunker()
+        ensure_sentence_tokenizer()
 
     @staticmethod
     def read_file(file_path: Path) -> str:
@@ -28,6 +109,17 @@ class DocumentProcessor:
         else:
             raise ValueError(f"Unsupported file type: {file_type}")
     
+    @staticmethod
+    def read_file_pages(file_path: Path, progress: Optional[Callable[[int, int], None]] = None) -> Iterable[str]:
+        """Read an uploaded file as a stream of pages (PDFs page by page, text files as one page)."""
+        if file_path.suffix.lower() == ".pdf":
+            with open(file_path, 'rb') as f:
+                return iter_pdf_pages(f.read(), progress=progress)
+        pages = [DocumentProcessor._read_text_file(file_path)]
+        if progress:
+            progress(1, 1)
+        return pages
+    
     @staticmethod
     def _read_text_file(file_path: Path) -> str:
         with open(file_path, 'r', encoding='utf-8') as f:
@@ -35,12 +127,9 @@ class DocumentProcessor:
     
     @staticmethod
     def _read_pdf_file(file_path: Path) -> str:
-        text = ""
         with open(file_path, 'rb') as f:
-            pdf_reader = PyPDF2.PdfReader(f)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+            data = f.read()
+        return "".join(page + "\n" for page in iter_pdf_pages(data))
     
     @staticmethod
     def _read_html_file(file_path: Path) -> str:
@@ -50,45 +139,9 @@ class DocumentProcessor:
 
 
     def chunk_text(self, text: str) -> list[str]:
-        """Break text into chunks using sentence tokenization."""
-        print("\nStarting chunking process...")
-        print(f"Input text length: {len(text)}")
-
-        try:
-            sentences = sent_tokenize(text)  # 🔹 More accurate sentence splitting
-            print(f"Split into {len(sentences)} sentences")
-
-            chunks = []
-            current_chunk = []
-            current_length = 0
-
-            for sentence in sentences:
-                sentence_length = len(sentence)
-
-                if current_length + sentence_length > self.chunk_size:
-                    # Save current chunk
-                    chunk_text = " ".join(current_chunk)
-                    print(f"Saving chunk of length {len(chunk_text)}")
-                    chunks.append(chunk_text)
-
-                    # Start new chunk with overlap
-                    overlap_tokens = current_chunk[-self.overlap:] if self.overlap > 0 else []
-                    current_chunk = overlap_tokens + [sentence]
-                    current_length = sum(len(t) for t in current_chunk)
-                else:
-                    current_chunk.append(sentence)
-                    current_length += sentence_length
-
-            if current_chunk:
-                chunk_text = " ".join(current_chunk)
-                print(f"Saving final chunk of length {len(chunk_text)}")
-                chunks.append(chunk_text)
-
-            print(f"Chunking complete. Created {len(chunks)} chunks")
-            return chunks
-
-        except Exception as e:
-            print(f"Error in chunk_text: {str(e)}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
-            raise
\ No newline at end of file
+        """Break text into token-sized chunks using sentence tokenization."""
+        return list(self.chunker.chunks(sent_tokenize(text)))
+
+    def chunk_pages(self, pages: Iterable[str]) -> Iterator[str]:
+        """Chunk a stream of pages, yielding each chunk as soon as it is complete."""
+        return self.chunker.chunks(sentence for page in pages for sentence in sent_tokenize(page))
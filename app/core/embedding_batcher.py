@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+import numpy as np
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, List, Tuple
+from app.config import QUERY_EMBED_BATCH_WINDOW, QUERY_EMBED_MAX_BATCH
+from app.core.embeddings import EmbeddingGenerator
+from app.utils import metrics
+from app.utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+class EmbeddingBatcher:
+    """Coalesces concurrent query embeddings into batched model calls.
+
+    Callers block in ``embed`` while a scheduler thread collects requests for
+    up to ``window`` seconds after the first one arrives (or until
+    ``max_batch`` are waiting), encodes them with one model call and hands
+    each caller its vector. A lone request waits at most ``window``.
+    ``embed_many`` queues bulk texts (the context sentences of a query) at a
+    lower priority: they are encoded only while no query is waiting, so a
+    query waits behind at most one batch of them.
+    """
+
+    def __init__(self, embedding_generator: EmbeddingGenerator, window: float = QUERY_EMBED_BATCH_WINDOW,
+                 max_batch: int = QUERY_EMBED_MAX_BATCH):
+        self.embedding_generator = embedding_generator
+        self.window = window
+        self.max_batch = max_batch
+        self._condition = threading.Condition()
+        self._queries: Deque[Tuple[str, bool, Future]] = deque()
+        self._bulk: Deque[Tuple[str, bool, Future]] = deque()
+        self.batch_sizes = Histogram(SIZE_BUCKETS)
+        self.queue_depths = Histogram(SIZE_BUCKETS)
+        self.batches = 0
+        self.requests = 0
+        self.bulk_batches = 0
+        self.bulk_requests = 0
+        metrics.register_histogram("rag_query_embed_batch_size", "Queries per embedding model call", self.batch_sizes)
+        metrics.register_histogram("rag_query_embed_queue_depth", "Queries waiting when a batch is formed",
+                                   self.queue_depths)
+        self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._thread.start()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embedding of one text, computed in a batch with concurrent callers."""
+        future = Future()
+        with self._condition:
+            self._queries.append((text, True, future))
+            self._condition.notify()
+        return future.result()
+
+    def embed_many(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+        """Embeddings of several texts, encoded at a lower priority than queries."""
+        futures = [Future() for _ in texts]
+        with self._condition:
+            self._bulk.extend((text, use_cache, future) for text, future in zip(texts, futures))
+            self._condition.notify()
+        return np.stack([future.result() for future in futures])
+
+    def _collect(self) -> Tuple[List[Tuple[str, bool, Future]], bool]:
+        """The next batch and whether it holds queries; queries always go first."""
+        with self._condition:
+            while not self._queries and not self._bulk:
+                self._condition.wait()
+            if not self._queries:
+                return [self._bulk.popleft() for _ in range(min(self.max_batch, len(self._bulk)))], False
+            batch = [self._queries.popleft()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                if self._queries:
+                    batch.append(self._queries.popleft())
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            # Requests still waiting behind this batch are part of the backlog too
+            self.queue_depths.observe(len(batch) + len(self._queries))
+            return batch, True
+
+    def _run(self):
+        while True:
+            batch, queries = self._collect()
+            if queries:
+                self.batch_sizes.observe(len(batch))
+                self.batches += 1
+                self.requests += len(batch)
+            else:
+                self.bulk_batches += 1
+                self.bulk_requests += len(batch)
+            for use_cache in (True, False):
+                requests = [(text, future) for text, cached, future in batch if cached == use_cache]
+                if not requests:
+                    continue
+                try:
+                    embeddings = self.embedding_generator.generate_embeddings([text for text, _ in requests],
+                                                                              use_cache=use_cache)
+                except Exception as e:
+                    logger.exception("Embedding a batch of %d texts failed", len(requests))
+                    for _, future in requests:
+                        future.set_exception(e)
+                    continue
+                for (_, future), embedding in zip(requests, embeddings):
+                    future.set_result(embedding)
+
+    def stats(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'queue_depth': len(self._queries),
+            'bulk_requests': self.bulk_requests,
+            'bulk_batches': self.bulk_batches,
+            'bulk_queue_depth': len(self._bulk),
+            'window': self.window,
+            'max_batch': self.max_batch,
+            'batch_size_histogram': self.batch_sizes.snapshot(),
+            'queue_depth_histogram': self.queue_depths.snapshot()
+        }
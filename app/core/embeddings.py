@@ -1,15 +1,223 @@
-from sentence_transformers import SentenceTransformer
-from app.config import EMBEDDING_MODEL
+import json
+import logging
+import os
+import threading
 import numpy as np
+from pathlib import Path
+from typing import Optional
+from app.config import EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_THREADS, EMBEDDING_ONNX_DIR
+from app.storage.embedding_cache import EmbeddingCache
+from app.utils.text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
 
 class EmbeddingGenerator:
-    def __init__(self):
-        self.model = SentenceTransformer(EMBEDDING_MODEL)
-    
+    """Sentence embeddings from ``EMBEDDING_MODEL`` on a configurable CPU backend.
+
+    - ``torch``: the fp32 SentenceTransformer.
+    - ``torch-int8``: the same model with its Linear layers dynamically
+      quantized to int8.
+    - ``onnx`` / ``onnx-int8``: the transformer exported to ONNX (and
+      optionally quantized) and run with ONNX Runtime; pooling and
+      normalization follow the SentenceTransformer pipeline. The export is
+      done once into ``EMBEDDING_ONNX_DIR``, after which torch is not loaded.
+
+    With a ``cache`` only texts it has not seen are encoded; the rest come
+    back from memory or disk (as float16-rounded vectors).
+    """
+
+    def __init__(self, backend: str = EMBEDDING_BACKEND, threads: int = EMBEDDING_THREADS,
+                 model_name: str = EMBEDDING_MODEL, cache: Optional[EmbeddingCache] = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported embedding backend: {backend}")
+        self.backend = backend
+        self.model_name = model_name
+        self.cache = cache
+        if backend.startswith("onnx"):
+            self._model = _OnnxEncoder(model_name, threads, quantize=backend == "onnx-int8")
+        else:
+            self._model = _TorchEncoder(model_name, threads, quantize=backend == "torch-int8")
+
+    def prepare(self):
+        """Finish loading in the current process; call in each server worker after the fork."""
+        if hasattr(self._model, 'prepare'):
+            self._model.prepare()
+
+    @property
+    def tokenizer(self):
+        """The model's tokenizer, for sizing text in model tokens."""
+        return self._model.tokenizer
+
+    @property
+    def model_key(self) -> str:
+        """Identifies the vectors this generator produces (model and backend)."""
+        return f"{self.model_name}@{self.backend}"
+
     def generate_embedding(self, text: str) -> np.ndarray:
         """Generate embedding for a single text."""
-        return self.model.encode(text)
-    
-    def generate_embeddings(self, texts: list[str]) -> np.ndarray:
-        """Generate embeddings for multiple texts."""
-        return self.model.encode(texts) 
\ No newline at end of file
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts: list[str], use_cache: bool = True) -> np.ndarray:
+        """Generate embeddings for multiple texts; ``use_cache=False`` skips the cache for one-off texts."""
+        if self.cache is None or not use_cache or not texts:
+            return self._model.encode(texts)
+        embeddings = self.cache.get_many(texts)
+        missing = {}  # Distinct uncached (normalized) text -> positions
+        for position, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(normalize_text(texts[position]), []).append(position)
+        if missing:
+            encoded = np.asarray(self._model.encode(list(missing)), dtype='float32')
+            self.cache.put_many(list(missing), encoded)
+            for positions, embedding in zip(missing.values(), encoded):
+                for position in positions:
+                    embeddings[position] = embedding
+        return np.stack(embeddings)
+
+class _TorchEncoder:
+    def __init__(self, model_name: str, threads: int, quantize: bool = False):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        if quantize:
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.tokenizer = self.model.tokenizer
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return self.model.encode(texts)
+
+class _OnnxEncoder:
+    def __init__(self, model_name: str, threads: int, quantize: bool = False):
+        from transformers import AutoTokenizer
+        model_dir = Path(EMBEDDING_ONNX_DIR) / model_name.replace("/", "__")
+        if not (model_dir / "embedding_config.json").exists():
+            _export_onnx(model_name, model_dir)
+        model_path = model_dir / "model.onnx"
+        if quantize:
+            model_path = model_dir / "model.int8.onnx"
+            if not model_path.exists():
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                quantize_dynamic(str(model_dir / "model.onnx"), str(model_path), weight_type=QuantType.QInt8)
+
+        with open(model_dir / "embedding_config.json") as f:
+            config = json.load(f)
+        self.max_seq_length = config['max_seq_length']
+        self.pooling = config['pooling']
+        self.normalize = config['normalize']
+        self.dimension = config.get('dimension')  # Missing from older exports
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.model_path = model_path
+        self.threads = threads
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+
+    def prepare(self):
+        self.session
+
+    @property
+    def session(self):
+        """This process's ONNX Runtime session.
+
+        Sessions are not fork-safe, so one is created per process on first
+        use rather than in a server's master before it forks its workers.
+        """
+        if self._session_pid != os.getpid():
+            with self._session_lock:
+                if self._session_pid != os.getpid():
+                    import onnxruntime as ort
+                    options = ort.SessionOptions()
+                    options.intra_op_num_threads = self.threads
+                    options.inter_op_num_threads = 1
+                    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    self._session = ort.InferenceSession(str(self.model_path), options,
+                                                         providers=["CPUExecutionProvider"])
+                    self.input_names = {node.name for node in self._session.get_inputs()}
+                    if self.dimension is None:
+                        self.dimension = self._session.get_outputs()[0].shape[-1]
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def encode(self, texts: list[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            if self.dimension is None:
+                self.prepare()
+            return np.empty((0, self.dimension), dtype='float32')
+        # Sort by length so each batch pads as little as possible
+        order = np.argsort([-len(text) for text in texts])
+        embeddings = [None] * len(texts)
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            for position, embedding in zip(batch, self._encode_batch([texts[i] for i in batch])):
+                embeddings[position] = embedding
+        return np.stack(embeddings)
+
+    def _encode_batch(self, texts: list[str]) -> np.ndarray:
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length,
+                                return_tensors="np")
+        session = self.session
+        feed = {name: inputs[name].astype('int64') for name in self.input_names}
+        token_embeddings = session.run(None, feed)[0]
+        mask = inputs['attention_mask'][..., None].astype('float32')
+        if self.pooling == "cls":
+            embeddings = token_embeddings[:, 0]
+        elif self.pooling == "max":
+            embeddings = np.where(mask > 0, token_embeddings, -1e9).max(axis=1)
+        else:
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings.astype('float32')
+
+def _export_onnx(model_name: str, model_dir: Path):
+    """Export the SentenceTransformer's transformer to ONNX, with its pooling settings."""
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+
+    logger.info("Exporting %s to ONNX in %s", model_name, model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    pooling = next((module for module in st_model if isinstance(module, models.Pooling)), None)
+    pooling_mode = "mean"
+    if pooling is not None and pooling.pooling_mode_cls_token:
+        pooling_mode = "cls"
+    elif pooling is not None and pooling.pooling_mode_max_tokens:
+        pooling_mode = "max"
+
+    tokenizer = transformer.tokenizer
+    sample = tokenizer(["an example sentence"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+
+    class _TokenEmbeddings(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs)))[0]
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _TokenEmbeddings(transformer.auto_model).eval(),
+            tuple(sample[name] for name in input_names),
+            str(model_dir / "model.onnx"),
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17
+        )
+    tokenizer.save_pretrained(str(model_dir))
+    with open(model_dir / "embedding_config.json", "w") as f:
+        json.dump({
+            'model': model_name,
+            'max_seq_length': st_model.max_seq_length,
+            'dimension': st_model.get_sentence_embedding_dimension(),
+            'pooling': pooling_mode,
+            'normalize': any(isinstance(module, models.Normalize) for module in st_model)
+        }, f)
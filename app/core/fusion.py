@@ -0,0 +1,47 @@
+from typing import Dict, List, Tuple
+from app.config import FUSION_METHOD, FUSION_WEIGHTS, RRF_K
+
+# A ranking is a best-first list of (chunk id, score) pairs from one retriever.
+# Scores must be "higher is better" (pass negated distances for L2 search).
+Ranking = List[Tuple[str, float]]
+
+def reciprocal_rank_fusion(rankings: Dict[str, Ranking], k: int = RRF_K,
+                           weights: Dict[str, float] = None) -> List[Dict]:
+    """Merge rankings by summing ``weight / (k + rank)``; only ranks matter, not raw scores."""
+    fused = {}
+    for retriever, ranking in rankings.items():
+        weight = (weights or {}).get(retriever, 1.0)
+        for rank, (chunk_id, score) in enumerate(ranking, start=1):
+            entry = fused.setdefault(chunk_id, {'id': chunk_id, 'score': 0.0, 'sources': {}})
+            entry['score'] += weight / (k + rank)
+            entry['sources'][retriever] = {'rank': rank, 'score': score}
+    return sorted(fused.values(), key=lambda entry: entry['score'], reverse=True)
+
+def weighted_score_fusion(rankings: Dict[str, Ranking], weights: Dict[str, float] = None) -> List[Dict]:
+    """Merge rankings by summing min-max normalized scores times each retriever's weight."""
+    fused = {}
+    for retriever, ranking in rankings.items():
+        if not ranking:
+            continue
+        weight = (weights or {}).get(retriever, 1.0)
+        scores = [score for _, score in ranking]
+        low, high = min(scores), max(scores)
+        for rank, (chunk_id, score) in enumerate(ranking, start=1):
+            normalized = (score - low) / (high - low) if high > low else 1.0
+            entry = fused.setdefault(chunk_id, {'id': chunk_id, 'score': 0.0, 'sources': {}})
+            entry['score'] += weight * normalized
+            entry['sources'][retriever] = {'rank': rank, 'score': score}
+    return sorted(fused.values(), key=lambda entry: entry['score'], reverse=True)
+
+def fuse(rankings: Dict[str, Ranking], method: str = FUSION_METHOD,
+         weights: Dict[str, float] = FUSION_WEIGHTS) -> List[Dict]:
+    """Merge per-retriever rankings into one best-first list.
+
+    Each entry is ``{'id', 'score', 'sources'}`` where ``sources`` maps a
+    retriever name to that retriever's rank and raw score for the chunk.
+    """
+    if method == "rrf":
+        return reciprocal_rank_fusion(rankings, weights=weights)
+    if method == "weighted":
+        return weighted_score_fusion(rankings, weights=weights)
+    raise ValueError(f"Unsupported fusion method: {method}")
@@ -0,0 +1,182 @@
+import hashlib
+import threading
+import time
+import numpy as np
+from typing import Callable, Dict, Iterable, Iterator, Optional
+from app.config import ES_BULK_BATCH_SIZE, EMBED_BATCH_SIZE
+from app.core.document_processor import DocumentProcessor
+from app.core.embeddings import EmbeddingGenerator
+from app.storage.faiss_client import FAISSClient
+from app.storage.elasticsearch_client import ElasticsearchClient
+from app.storage.redis_client import RedisClient
+from app.storage.chunk_store import ChunkStore
+from app.utils import tracing
+
+def hash_content(text: str) -> str:
+    """Content hash used to recognise unchanged chunks across uploads."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def make_chunk_id(source: str, content_hash: str, occurrence: int = 0) -> int:
+    """Return a stable, globally unique 63-bit ID for a chunk.
+
+    The ID is derived from the source, the chunk's content hash and how many
+    identical chunks precede it in the source, so an unchanged chunk keeps
+    its ID when the document is edited elsewhere. The same ID keys the vector
+    in FAISS and the chunk (``_id`` and ``embedding_id``) in Elasticsearch.
+    It is kept positive because FAISS reserves -1 for empty result slots.
+    """
+    key = f"{source}\x00{content_hash}\x00{occurrence}".encode('utf-8')
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(digest, 'big') & 0x7FFFFFFFFFFFFFFF
+
+def _timed(iterable: Iterable, timings: Dict, key: str) -> Iterator:
+    """Yield from ``iterable``, adding the time spent producing each item to ``timings[key]``."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[key] += time.perf_counter() - start
+            return
+        timings[key] += time.perf_counter() - start
+        yield item
+
+SOURCE_LOCKS = 64  # Lock stripes serializing ingestion per source
+
+class DocumentIndexer:
+    """Bulk ingestion pipeline: chunk -> embed -> FAISS -> Elasticsearch."""
+
+    def __init__(self, document_processor: DocumentProcessor, embedding_generator: EmbeddingGenerator,
+                 faiss_client: FAISSClient, es_client: ElasticsearchClient,
+                 redis_client: RedisClient = None, chunk_store: ChunkStore = None,
+                 batch_size: int = ES_BULK_BATCH_SIZE):
+        self.document_processor = document_processor
+        self.embedding_generator = embedding_generator
+        self.faiss_client = faiss_client
+        self.es_client = es_client
+        self.redis_client = redis_client
+        self.chunk_store = chunk_store
+        self.batch_size = batch_size
+        self._source_locks = [threading.Lock() for _ in range(SOURCE_LOCKS)]
+
+    def index_document(self, source: str, content: str) -> Dict:
+        """Index a whole document in one pass and return per-stage timings (seconds)."""
+        return self.index_pages(source, [content])
+
+    def index_pages(self, source: str, pages: Iterable[str],
+                    on_stage: Optional[Callable[[str, int], None]] = None,
+                    document_hash: Optional[str] = None) -> Dict:
+        """Index a document streamed as pages, re-indexing only its changed chunks; returns stats and timings."""
+        # Uploads of the same source are indexed one at a time
+        lock = self._source_locks[int(hash_content(source)[:8], 16) % SOURCE_LOCKS]
+        with lock, tracing.span('ingest'):
+            stats = self._index_pages(source, pages, on_stage, document_hash)
+        for stage, seconds in stats['timings'].items():
+            tracing.observe(f'ingest_{stage}', seconds)
+        return stats
+
+    def _index_pages(self, source: str, pages: Iterable[str], on_stage: Optional[Callable[[str, int], None]],
+                     document_hash: Optional[str]) -> Dict:
+        on_stage = on_stage or (lambda stage, chunks: None)
+        timings = {'extract_chunk': 0.0, 'embed': 0.0}
+        indexed = self.chunk_store.get_chunks(source) if self.chunk_store is not None else {}
+
+        if document_hash is not None and indexed and self.chunk_store.get_document_hash(source) == document_hash:
+            return {'chunks': len(indexed), 'new': 0, 'unchanged': len(indexed), 'removed': 0,
+                    'timings': timings}
+
+        chunk_hashes = []  # (chunk id, content hash) of every chunk, in document order
+        new_chunks = []  # (chunk id, text) of chunks that are not indexed yet
+        occurrences = {}
+        embedding_batches = []
+        batch = []
+
+        def embed(batch):
+            start = time.perf_counter()
+            embedding_batches.append(
+                np.asarray(self.embedding_generator.generate_embeddings(batch), dtype='float32'))
+            timings['embed'] += time.perf_counter() - start
+
+        for chunk in _timed(self.document_processor.chunk_pages(pages), timings, 'extract_chunk'):
+            content_hash = hash_content(chunk)
+            occurrence = occurrences.get(content_hash, 0)
+            occurrences[content_hash] = occurrence + 1
+            chunk_id = make_chunk_id(source, content_hash, occurrence)
+            chunk_hashes.append((chunk_id, content_hash))
+            if chunk_id in indexed:
+                continue
+            new_chunks.append((chunk_id, chunk))
+            batch.append(chunk)
+            if len(batch) >= EMBED_BATCH_SIZE:
+                embed(batch)
+                batch = []
+                on_stage('extracting', len(chunk_hashes))
+        if batch:
+            embed(batch)
+
+        current_ids = {chunk_id for chunk_id, _ in chunk_hashes}
+        removed_ids = [chunk_id for chunk_id in indexed if chunk_id not in current_ids]
+        stats = {
+            'chunks': len(chunk_hashes),
+            'new': len(new_chunks),
+            'unchanged': len(chunk_hashes) - len(new_chunks),
+            'removed': len(removed_ids),
+            'timings': timings
+        }
+
+        # Nothing is written before every page has been read, so a failing page leaves the indexes untouched
+        if removed_ids:
+            on_stage('removing', len(chunk_hashes))
+            start = time.perf_counter()
+            self.faiss_client.remove_ids(np.array(removed_ids, dtype='int64'), flush=False)
+            self.es_client.delete_documents(removed_ids, batch_size=self.batch_size)
+            timings['remove'] = time.perf_counter() - start
+
+        if new_chunks:
+            chunk_ids = np.array([chunk_id for chunk_id, _ in new_chunks], dtype='int64')
+            embeddings = np.concatenate(embedding_batches)
+
+            on_stage('indexing_faiss', len(chunk_hashes))
+            start = time.perf_counter()
+            self.faiss_client.add_embeddings(embeddings, chunk_ids, flush=False)
+            timings['faiss_add'] = time.perf_counter() - start
+
+            on_stage('indexing_es', len(chunk_hashes))
+            start = time.perf_counter()
+            documents = (
+                {
+                    'doc_id': str(chunk_id),
+                    'content': chunk,
+                    'metadata': {'source': source},
+                    'embedding_id': chunk_id
+                }
+                for chunk_id, chunk in new_chunks
+            )
+            es_indexed = self.es_client.bulk_index_documents(documents, batch_size=self.batch_size)
+            timings['es_bulk'] = time.perf_counter() - start
+            if es_indexed != len(new_chunks):
+                raise RuntimeError(f"Elasticsearch indexed {es_indexed} of {len(new_chunks)} chunks of {source}")
+
+        if new_chunks or removed_ids:
+            on_stage('flushing', len(chunk_hashes))
+            start = time.perf_counter()
+            self.faiss_client.flush()
+            timings['faiss_flush'] = time.perf_counter() - start
+
+        # Chunks the store lists are skipped on the next upload, so it is written
+        # last: after FAISS has flushed and Elasticsearch has accepted every
+        # chunk, a crash can only leave chunks that get indexed again
+        if self.chunk_store is not None:
+            self.chunk_store.replace(source, chunk_hashes, document_hash)
+
+        if not (new_chunks or removed_ids):
+            return stats
+
+        if self.redis_client is not None:
+            # New content invalidates answers computed against the old corpus;
+            # answers built from an earlier version of this source go eagerly
+            self.redis_client.invalidate_source(source)
+            self.redis_client.bump_corpus_version()
+
+        return stats
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+from app.config import INGEST_QUEUE_BACKEND, INGEST_WORKERS, INGEST_JOB_TTL, INGEST_JOB_LEASE
+from app.core.document_processor import DocumentProcessor
+from app.core.indexer import DocumentIndexer
+from app.storage.redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "ingest:queue"
+PROCESSING_KEY = "ingest:processing"  # Jobs taken by a worker and not finished yet
+LEASE_KEY_PREFIX = "ingest:lease:"  # Expires unless the worker running the job keeps renewing it
+JOB_KEY_PREFIX = "ingest:job:"
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class IngestQueue:
+    """Background ingestion: uploads are queued as jobs and indexed by a worker pool.
+
+    With the "redis" backend job IDs go through a Redis list and job state
+    is stored in Redis, so any process running workers can pick jobs up and
+    any process can report their status. A worker moves the job ID to a
+    processing list while it runs the job and holds a lease it renews on
+    every progress update; the ID leaves the list only when the job has
+    finished. Jobs whose lease expired (their worker died) are queued again
+    when workers start. If Redis is unreachable (or the backend is
+    "memory") an in-process queue and state dict are used.
+    """
+
+    def __init__(self, indexer: Optional[DocumentIndexer], redis_client: RedisClient,
+                 backend: str = INGEST_QUEUE_BACKEND, workers: int = INGEST_WORKERS):
+        self.indexer = indexer
+        self.redis = redis_client.redis
+        self.backend = backend
+        if backend == "redis":
+            try:
+                self.redis.ping()
+            except Exception as e:
+                logger.warning("Redis unavailable for the ingest queue (%s); using the in-process queue", e)
+                self.backend = "memory"
+        if not workers and self.backend == "memory":
+            logger.error("This process has no ingest workers and no shared queue; uploads to it will not be indexed")
+        self._queue = queue.Queue()
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        if workers and self.backend == "redis":
+            self._requeue_stale()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"ingest-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, source: str, file_path: Path) -> Dict:
+        """Queue a stored upload for indexing and return the new job's state."""
+        job = {
+            'id': uuid.uuid4().hex,
+            'source': source,
+            'path': str(file_path),
+            'status': 'queued',
+            'stage': 'queued',
+            'pages_done': 0,
+            'pages_total': None,
+            'chunks': 0,
+            'timings': {},
+            'throughput': {},
+            'error': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None
+        }
+        self._save(job)
+        if self.backend == "redis":
+            self.redis.rpush(QUEUE_KEY, job['id'])
+        else:
+            self._queue.put(job['id'])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Current state of a job, or None if it is unknown or expired."""
+        if self.backend == "redis":
+            value = self.redis.get(JOB_KEY_PREFIX + job_id)
+            return json.loads(value) if value else None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _save(self, job: Dict):
+        if self.backend == "redis":
+            pipe = self.redis.pipeline()
+            pipe.setex(JOB_KEY_PREFIX + job['id'], INGEST_JOB_TTL, json.dumps(job))
+            if job['status'] == 'running':
+                pipe.setex(LEASE_KEY_PREFIX + job['id'], INGEST_JOB_LEASE, os.getpid())
+            pipe.execute()
+        else:
+            with self._lock:
+                self._jobs[job['id']] = dict(job)
+
+    def _next_job_id(self) -> str:
+        if self.backend == "redis":
+            while True:
+                job_id = self.redis.blmove(QUEUE_KEY, PROCESSING_KEY, 5, "LEFT", "RIGHT")
+                if job_id:
+                    job_id = job_id.decode('utf-8')
+                    self.redis.setex(LEASE_KEY_PREFIX + job_id, INGEST_JOB_LEASE, os.getpid())
+                    return job_id
+        return self._queue.get()
+
+    def _ack(self, job_id: str):
+        """Remove a finished (or unknown) job from the processing list."""
+        if self.backend == "redis":
+            pipe = self.redis.pipeline()
+            pipe.lrem(PROCESSING_KEY, 1, job_id)
+            pipe.delete(LEASE_KEY_PREFIX + job_id)
+            pipe.execute()
+
+    def _requeue_stale(self):
+        """Queue again the jobs whose worker stopped renewing their lease."""
+        try:
+            for job_id in self.redis.lrange(PROCESSING_KEY, 0, -1):
+                job_id = job_id.decode('utf-8')
+                if self.redis.exists(LEASE_KEY_PREFIX + job_id):
+                    continue
+                pipe = self.redis.pipeline()
+                pipe.lrem(PROCESSING_KEY, 1, job_id)
+                pipe.lpush(QUEUE_KEY, job_id)
+                pipe.execute()
+                logger.warning("Re-queued ingest job %s; its worker stopped before finishing it", job_id)
+        except Exception:
+            logger.exception("Could not re-queue interrupted ingest jobs")
+
+    def _work(self):
+        while True:
+            try:
+                job_id = self._next_job_id()
+                job = self.get(job_id)
+            except Exception:
+                logger.exception("Could not fetch the next ingest job")
+                time.sleep(1)
+                continue
+            try:
+                # A finished job can come back if its worker died before acknowledging it
+                if job is not None and job['status'] not in ('done', 'failed'):
+                    self._run(job)
+            finally:
+                try:
+                    self._ack(job_id)
+                except Exception:
+                    logger.exception("Could not acknowledge ingest job %s", job_id)
+
+    def _run(self, job: Dict):
+        job.update(status='running', stage='extracting', started_at=time.time())
+        self._save(job)
+        path = Path(job['path'])
+
+        def on_pages(done, total):
+            job.update(pages_done=done, pages_total=total)
+            self._update_throughput(job)
+            self._save(job)
+
+        def on_stage(stage, chunks):
+            job.update(stage=stage, chunks=chunks)
+            self._update_throughput(job)
+            self._save(job)
+
+        try:
+            pages = DocumentProcessor.read_file_pages(path, progress=on_pages)
+            stats = self.indexer.index_pages(job['source'], pages, on_stage=on_stage,
+                                             document_hash=hash_file(path))
+            job.update(status='done', stage='done', chunks=stats['chunks'], timings=stats['timings'],
+                       new_chunks=stats['new'], unchanged_chunks=stats['unchanged'],
+                       removed_chunks=stats['removed'])
+        except Exception as e:
+            logger.exception("Ingest job %s for %s failed", job['id'], job['source'])
+            job.update(status='failed', error=str(e))
+        finally:
+            job['finished_at'] = time.time()
+            self._update_throughput(job)
+            self._save(job)
+            path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _update_throughput(job: Dict):
+        elapsed = (job['finished_at'] or time.time()) - job['started_at']
+        if elapsed > 0:
+            job['throughput'] = {
+                'elapsed': elapsed,
+                'pages_per_second': job['pages_done'] / elapsed,
+                'chunks_per_second': job['chunks'] / elapsed
+            }
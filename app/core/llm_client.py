@@ -0,0 +1,231 @@
+import fcntl
+import hashlib
+import json
+import logging
+import threading
+import time
+import requests
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterator, List, Optional
+from app.config import OLLAMA_URL, LLM_MODEL, LLM_TIMEOUT, LLM_MAX_CONCURRENCY, LLM_QUEUE_TIMEOUT, LLM_KEEP_ALIVE
+from app.utils import metrics
+from app.utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+WAIT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class LLMBusyError(RuntimeError):
+    """No generation slot became free within ``LLM_QUEUE_TIMEOUT``."""
+
+class _FileSemaphore:
+    """A semaphore shared by every process that uses the same directory.
+
+    Each slot is an exclusive ``flock`` on one of ``value`` files, so a slot
+    held by a process that dies is freed with it. Like ``BoundedSemaphore``,
+    ``release`` must be called by the thread that acquired.
+    """
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, directory: Path, value: int):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.paths = [directory / f"slot-{i}.lock" for i in range(value)]
+        self._held = threading.local()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            for path in self.paths:
+                slot = open(path, "a")
+                try:
+                    fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    slot.close()
+                    continue
+                self._held.slot = slot
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.POLL_INTERVAL)
+
+    def release(self):
+        slot = self._held.slot
+        self._held.slot = None
+        fcntl.flock(slot, fcntl.LOCK_UN)
+        slot.close()
+
+class _Generation:
+    """One upstream generation, shared by every caller that asked for the same prompt."""
+
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.done = False
+        self.cancelled = False
+        self.error: Optional[Exception] = None
+        self.subscribers = 0
+        self.condition = threading.Condition()
+
+class OllamaClient:
+    """Ollama client with pooled keep-alive connections and bounded concurrency.
+
+    At most ``max_concurrency`` generations run upstream at once; the rest
+    wait for a slot (up to ``queue_timeout`` seconds, then ``LLMBusyError``).
+    With ``slots_dir`` the limit is shared by every process using that
+    directory, otherwise it applies to this process alone.
+    Identical in-flight prompts are coalesced: the first caller starts the
+    generation and later callers replay its tokens instead of starting their
+    own. A generation is abandoned once every caller has stopped reading.
+    """
+
+    def __init__(self, url: str = OLLAMA_URL, model: str = LLM_MODEL, timeout=LLM_TIMEOUT,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, queue_timeout: float = LLM_QUEUE_TIMEOUT,
+                 slots_dir: Optional[Path] = None):
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.max_concurrency = max_concurrency
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if slots_dir is not None:
+            self._slots = _FileSemaphore(Path(slots_dir), max_concurrency)
+        else:
+            self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._generations: Dict[str, _Generation] = {}
+        self.queue_wait = Histogram(WAIT_BUCKETS)
+        self.waiting = 0
+        self.in_flight = 0
+        self.generations = 0
+        self.coalesced = 0
+        self.rejected = 0
+        metrics.register_histogram("rag_llm_queue_wait_seconds", "Time generations wait for an LLM slot",
+                                   self.queue_wait)
+        metrics.register_collector("llm", {
+            "rag_llm_in_flight": ("gauge", "Generations running in Ollama"),
+            "rag_llm_waiting": ("gauge", "Generations waiting for a slot"),
+            "rag_llm_generations_total": ("counter", "Generations started"),
+            "rag_llm_coalesced_total": ("counter", "Requests served by another request's generation"),
+            "rag_llm_rejected_total": ("counter", "Generations that timed out waiting for a slot")
+        }, self._samples)
+
+    def generate(self, prompt: str) -> str:
+        """The full completion for a prompt."""
+        return ''.join(self.stream(prompt))
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield the completion's tokens as they are generated."""
+        key = hashlib.blake2b(f"{self.model}\x00{prompt}".encode('utf-8'), digest_size=16).hexdigest()
+        with self._lock:
+            generation = self._generations.get(key)
+            if generation is None:
+                generation = self._generations[key] = _Generation()
+                self.generations += 1
+                threading.Thread(target=self._generate, args=(key, generation, prompt),
+                                 name="llm-generate", daemon=True).start()
+            else:
+                self.coalesced += 1
+            with generation.condition:
+                generation.subscribers += 1
+
+        position = 0
+        try:
+            while True:
+                with generation.condition:
+                    while position >= len(generation.tokens) and not generation.done:
+                        generation.condition.wait()
+                    tokens = generation.tokens[position:]
+                    position = len(generation.tokens)
+                    done, error = generation.done, generation.error
+                yield from tokens
+                if done:
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            with self._lock, generation.condition:
+                generation.subscribers -= 1
+                if not generation.subscribers and not generation.done:
+                    # Nobody is reading any more; stop generating
+                    generation.cancelled = True
+                    if self._generations.get(key) is generation:
+                        del self._generations[key]
+
+    def _generate(self, key: str, generation: _Generation, prompt: str):
+        queued = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        self.queue_wait.observe(time.perf_counter() - queued)
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.in_flight += 1
+            else:
+                self.rejected += 1
+        try:
+            if not acquired:
+                raise LLMBusyError(f"All {self.max_concurrency} LLM slots stayed busy for {self.queue_timeout}s")
+            if not generation.cancelled:
+                self._post(generation, prompt)
+        except Exception as e:
+            logger.warning("LLM generation failed: %s", e)
+            generation.error = e
+        finally:
+            if acquired:
+                self._slots.release()
+            with self._lock:
+                if acquired:
+                    self.in_flight -= 1
+                if self._generations.get(key) is generation:
+                    del self._generations[key]
+            with generation.condition:
+                generation.done = True
+                generation.condition.notify_all()
+
+    def _post(self, generation: _Generation, prompt: str):
+        payload = {"model": self.model, "prompt": prompt, "stream": True, "keep_alive": LLM_KEEP_ALIVE}
+        with self.session.post(self.url, json=payload, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if generation.cancelled:
+                    return
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if 'error' in chunk:
+                    raise RuntimeError(f"Ollama error: {chunk['error']}")
+                token = chunk.get('response', '')
+                if token:
+                    with generation.condition:
+                        generation.tokens.append(token)
+                        generation.condition.notify_all()
+                if chunk.get('done'):
+                    return
+
+    def _samples(self):
+        with self._lock:
+            return [
+                ("rag_llm_in_flight", {}, self.in_flight),
+                ("rag_llm_waiting", {}, self.waiting),
+                ("rag_llm_generations_total", {}, self.generations),
+                ("rag_llm_coalesced_total", {}, self.coalesced),
+                ("rag_llm_rejected_total", {}, self.rejected)
+            ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'model': self.model,
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'generations': self.generations,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+                'queue_wait_seconds': self.queue_wait.snapshot()
+            }
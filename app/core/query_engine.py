@@ -1,118 +1,247 @@
-print("QueryEngine module loaded!")  # This should print when Flask starts
-
-from typing import List, Dict
-import numpy as np
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
 from app.core.embeddings import EmbeddingGenerator
+from app.core.embedding_batcher import EmbeddingBatcher
+from app.core.llm_client import OllamaClient
+from app.core.context_builder import ContextBuilder
 from app.storage.faiss_client import FAISSClient
 from app.storage.elasticsearch_client import ElasticsearchClient
 from app.storage.redis_client import RedisClient
-import requests
-import json
+from app.core.semantic_cache import SemanticCache
+from app.config import (
+    QUERY_WORKERS, DEBUG_MODE, QUERY_CACHE_TIMEOUT, QUERY_VECTOR_TIMEOUT, QUERY_BM25_TIMEOUT,
+    VECTOR_CANDIDATES, BM25_CANDIDATES, CONTEXT_CANDIDATES
+)
+from app.core.fusion import fuse
+from app.utils import tracing
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
 
 class QueryEngine:
-    def __init__(self):
-        print("QueryEngine initialized!")
-        self.embedding_generator = EmbeddingGenerator()
-        self.faiss_client = FAISSClient()
-        self.es_client = ElasticsearchClient()
-        self.redis_client = RedisClient()
-        self.ollama_url = "http://localhost:11434/api/generate"
+    def __init__(self, embedding_generator: EmbeddingGenerator, faiss_client: FAISSClient,
+                 es_client: ElasticsearchClient, redis_client: RedisClient,
+                 semantic_cache: SemanticCache = None, embedding_batcher: EmbeddingBatcher = None,
+                 llm_client: OllamaClient = None, context_builder: ContextBuilder = None):
+        self.embedding_generator = embedding_generator
+        self.faiss_client = faiss_client
+        self.es_client = es_client
+        self.redis_client = redis_client
+        self.semantic_cache = semantic_cache
+        self.embedding_batcher = embedding_batcher
+        self.llm_client = llm_client or OllamaClient()
+        self.model = self.llm_client.model
+        self.context_builder = context_builder or ContextBuilder(embedding_generator,
+                                                                 embedding_batcher=embedding_batcher)
+        self.executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="query")
         
-    def query(self, query_text: str, k: int = 5) -> dict:
+    def query(self, query_text: str, k: int = VECTOR_CANDIDATES, nprobe: int = None, ef_search: int = None) -> dict:
+        with tracing.span('query'):
+            prepared = self._prepare(query_text, k, nprobe, ef_search)
+            if 'result' in prepared:
+                return prepared['result']
+
+            answer = ''.join(self._generate(prepared['prompt']))
+            result = {'results': [answer.strip()]}
+            self._cache_result(query_text, prepared, result)
+            return self._with_debug(result, prepared)
+
+    def query_stream(self, query_text: str, k: int = VECTOR_CANDIDATES, nprobe: int = None,
+                     ef_search: int = None) -> Iterator[Dict]:
+        """Answer a query as a stream of events.
+
+        Yields ``{'token': str}`` events as Ollama generates them, then one
+        ``{'done': True, 'results': [...]}`` event. Cached answers are replayed
+        through the same events. The assembled answer is cached only once the
+        stream completes, so an aborted stream caches nothing.
+        """
+        start = time.perf_counter()
+        prepared = self._prepare(query_text, k, nprobe, ef_search)
+        if 'result' in prepared:
+            for answer in prepared['result']['results']:
+                yield {'token': answer}
+            tracing.observe('query_stream', time.perf_counter() - start)
+            yield {'done': True, 'cached': prepared.get('cached', False), **prepared['result']}
+            return
+
+        parts = []
+        for token in self._generate(prepared['prompt']):
+            parts.append(token)
+            yield {'token': token}
+
+        result = {'results': [''.join(parts).strip()]}
+        self._cache_result(query_text, prepared, result)
+        tracing.observe('query_stream', time.perf_counter() - start)
+        yield {'done': True, 'cached': False, **self._with_debug(result, prepared)}
+
+    def _generate(self, prompt: str) -> Iterator[str]:
+        """Stream the LLM's tokens, timing the first token and the whole generation."""
+        start = time.perf_counter()
+        first = True
+        with tracing.span('llm_generate'):
+            for token in self.llm_client.stream(prompt):
+                if first:
+                    tracing.observe('llm_first_token', time.perf_counter() - start)
+                    first = False
+                yield token
+
+    def _prepare(self, query_text: str, k: int, nprobe: int, ef_search: int) -> Dict:
+        """Run the cache lookups and hybrid retrieval concurrently; returns a cached ``result`` or the ``prompt``."""
+        # Stages wait only on futures submitted before them, which the pool
+        # has always started first, so they cannot deadlock it
+        version_future = self._submit('corpus_version', self.redis_client.get_corpus_version)
+        cache_future = self._submit('cache_lookup', self._cached_answer, query_text, version_future)
+        bm25_future = self._submit('bm25_search', self.es_client.search, query_text, size=BM25_CANDIDATES)
+        cancelled = threading.Event()
+        vector_future = self._submit('vector_search', self._vector_search, query_text, k, nprobe, ef_search,
+                                     version_future, cancelled)
+        pending = [bm25_future, vector_future]
+
         try:
-            # Check Redis cache first
-            cached_result = self.redis_client.get_cache(query_text)
-            print(f"🟡 Backend: Cached result for '{query_text}': {cached_result}")
+            # Check Redis cache first (keys are scoped to the current corpus version)
+            cached_result = self._stage_result(cache_future, QUERY_CACHE_TIMEOUT, 'cache lookup', None)
             if cached_result:
-                print("🟡 Backend: Returning cached result from Redis")
-                return cached_result
-            
-            # Generate embedding for query
-            print(f"🟡 Backend: Processing query: {query_text}")
-            query_embedding = self.embedding_generator.generate_embeddings([query_text])[0]
-            
-            # Search FAISS
-            distances, indices = self.faiss_client.search(query_embedding, k)
-            print(f"🟡 Backend: FAISS found {len(indices[0])} similar documents")
-
-            # Get Elasticsearch content
-            print(f"🟡 Backend: Retrieving content from Elasticsearch...")
-            search_body = {
-                "query": {
-                    "bool": {
-                        "should": [
-                            {  # ✅ Retrieve documents that match FAISS results
-                                "terms": {
-                                    "embedding_id": indices[0].tolist()
-                                }
-                            },
-                            {  # ✅ ALSO retrieve documents that contain the query text
-                                "match": {
-                                    "content": query_text
-                                }
-                            }
-                        ],
-                        "minimum_should_match": 1  # Ensure at least one condition is met
-                    }
-                },
-                "size": 3  # Restrict to top 3 most relevant results
-            }
-
-            response = self.es_client.es.search(
-                index=self.es_client.index_name,
-                body=search_body
-            )
-            
-            hits = response['hits']['hits']
-            if hits:
-                print(f"🟡 Backend: Found {len(hits)} matching documents in Elasticsearch")
-                relevant_content = [hit['_source']['content'] for hit in hits]
-                # context = "\n".join(relevant_content)
-                context = "\n".join(relevant_content[:2])  # Only keep top 2 most relevant
-                
-                # Query Ollama
-                print(f"🟡 Backend: Querying Ollama...")
-
-                prompt = f"""
-                            Based on the following retrieved information:
-                {context}
-
-                 Only use this context to answer the question:
-                {query_text}
-                If the context does not answer the question, say "I don’t know based on the given information."
-                """
-
-                # payload = {
-                #     "model": "mistral",
-                #     "prompt": f"Context: {context}\n\nQuestion: {query_text}\n\nAnswer:",
-                #     "stream": False
-                # }
-                payload = {
-                    "model": "mistral",
-                    "prompt": prompt,
-                    "stream": False
-                }
-                
-                ollama_response = requests.post(self.ollama_url, json=payload)
-                response_json = ollama_response.json()
-                print(f"🟡 Backend: Received response from Ollama")
-                
-                if 'response' in response_json:
-                    print(f"🟡 Backend: Returning response from Ollama")
-                    result = {'results': [response_json['response'].strip()]}
-                    
-                    # Cache the result in Redis
-                    self.redis_client.set_cache(query_text, result)
-                    print(f"🟡 Backend: Cached result for '{query_text}' in Redis")
-                    return result
+                logger.debug("Answer cache hit for %r", query_text)
+                return {'result': cached_result, 'cached': True}
+
+            vector_result = self._stage_result(vector_future, QUERY_VECTOR_TIMEOUT, 'vector search', None)
+            if vector_result is not None and 'result' in vector_result:
+                logger.debug("Semantic cache hit for %r", query_text)
+                return vector_result
+            bm25_hits = self._stage_result(bm25_future, QUERY_BM25_TIMEOUT, 'text search', [])
+            # Without a corpus version the answer is neither looked up nor cached
+            corpus_version = self._stage_result(version_future, QUERY_CACHE_TIMEOUT, 'corpus version', None)
+        finally:
+            cancelled.set()
+            for future in pending:
+                future.cancel()
+
+        query_embedding = vector_result['query_embedding'] if vector_result else None
+        rankings = {
+            'vector': vector_result['ranking'] if vector_result else [],
+            'bm25': [(hit['_id'], hit['_score']) for hit in bm25_hits]
+        }
+        with tracing.span('fusion'):
+            fused = fuse(rankings)
+        logger.debug("Fused %d vector and %d text hits", len(rankings['vector']), len(rankings['bm25']))
+
+        # BM25 hits already carry their text; fetch the rest with one multi-get.
+        # Vectors without a document (e.g. deleted from Elasticsearch only)
+        # are dropped before truncating, so the next candidates take their place.
+        documents = {hit['_id']: hit for hit in bm25_hits}
+        missing = [int(entry['id']) for entry in fused if entry['id'] not in documents]
+        if missing:
+            with tracing.span('es_fetch'):
+                documents.update((doc['_id'], doc) for doc in self.es_client.get_documents(missing))
+        fused = [entry for entry in fused if entry['id'] in documents][:CONTEXT_CANDIDATES]
+        hits = [documents[entry['id']] for entry in fused]
+
+        if not hits:
+            logger.debug("No matching documents for %r", query_text)
+            return {'result': {'results': ["No relevant information found."]}}
+
+        with tracing.span('prompt_build'):
+            context = self.context_builder.build(query_text, query_embedding,
+                                                 [hit['_source']['content'] for hit in hits])
+        used = [passage['index'] for passage in context['passages']]
+        logger.debug("Using %d of %d fused documents (%d tokens) as context", len(used), len(hits), context['tokens'])
+        return {
+            'prompt': context['prompt'],
+            'sources': [hits[i]['_source']['metadata']['source'] for i in used],
+            'corpus_version': corpus_version,
+            'query_embedding': query_embedding,
+            'retrieval': [
+                {'id': entry['id'], 'source': hit['_source']['metadata']['source'],
+                 'score': entry['score'], 'sources': entry['sources'], 'in_context': i in used}
+                for i, (entry, hit) in enumerate(zip(fused, hits))
+            ]
+        }
+
+    def _cached_answer(self, query_text: str, version_future: Future):
+        corpus_version = self._corpus_version(version_future)
+        if corpus_version is None:
+            return None
+        return self.redis_client.get_answer(query_text, self.model, corpus_version)
+
+    @staticmethod
+    def _corpus_version(version_future: Future) -> Optional[int]:
+        """The corpus version, or None if it is not available within ``QUERY_CACHE_TIMEOUT``."""
+        try:
+            return version_future.result(timeout=QUERY_CACHE_TIMEOUT)
+        except Exception:  # Logged once, by _prepare
+            return None
+
+    def _vector_search(self, query_text: str, k: int, nprobe: int, ef_search: int, version_future: Future,
+                       cancelled: threading.Event) -> Optional[Dict]:
+        """Embed the query, check the semantic cache, then search FAISS.
+
+        Returns the query embedding and the FAISS ranking as (chunk id,
+        negated L2 distance) pairs, best first, or None if ``cancelled`` was
+        set before the stage finished.
+        """
+        if cancelled.is_set():
+            return None
+        with tracing.span('embed'):
+            if self.embedding_batcher is not None:
+                query_embedding = self.embedding_batcher.embed(query_text)
             else:
-                print(f"🟡 Backend: No matching documents found")
-                return {
-                    'results': ["No relevant information found."],
-                }
-                
+                query_embedding = self.embedding_generator.generate_embeddings([query_text])[0]
+
+        # Check the semantic cache for an answer to a paraphrase of this query
+        if self.semantic_cache is not None and not cancelled.is_set():
+            corpus_version = self._corpus_version(version_future)
+            if corpus_version is not None:
+                with tracing.span('semantic_cache'):
+                    cached_result = self.semantic_cache.get(query_embedding, corpus_version)
+                if cached_result:
+                    return {'result': cached_result, 'cached': True}
+
+        if cancelled.is_set():
+            return None
+        with tracing.span('faiss_search'):
+            distances, indices = self.faiss_client.search(query_embedding, k, nprobe=nprobe, ef_search=ef_search)
+        ranking = [(str(int(i)), -float(d)) for d, i in zip(distances[0], indices[0]) if i != -1]
+        return {'query_embedding': query_embedding, 'ranking': ranking}
+
+    def _submit(self, stage: str, function: Callable, *args, **kwargs) -> Future:
+        """Run a pipeline stage on the thread pool as a span of the caller's trace."""
+        def run():
+            with tracing.span(stage):
+                return function(*args, **kwargs)
+        return self.executor.submit(tracing.bind(run))
+
+    @staticmethod
+    def _stage_result(future: Future, timeout: float, stage: str, default):
+        """Wait for a pipeline stage; a timed-out or failed optional stage yields ``default``."""
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            logger.warning("%s timed out after %ss", stage, timeout)
         except Exception as e:
-            print(f"🔴 Backend: Error: {str(e)}")
-            import traceback
-            print(f"Traceback: {traceback.format_exc()}")
-            raise 
\ No newline at end of file
+            logger.warning("%s failed: %s", stage, e)
+        future.cancel()
+        return default
+
+    @staticmethod
+    def _with_debug(result: Dict, prepared: Dict) -> Dict:
+        """Attach per-chunk fusion scores to a fresh (never a cached) result in debug mode."""
+        if not DEBUG_MODE:
+            return result
+        return {**result, 'debug': {'retrieval': prepared['retrieval']}}
+
+    def _cache_result(self, query_text: str, prepared: Dict, result: Dict):
+        """Cache a generated answer; failing to do so never fails the answer itself."""
+        corpus_version = prepared['corpus_version']
+        if corpus_version is None:
+            return
+        with tracing.span('cache_store'):
+            try:
+                self.redis_client.set_answer(query_text, self.model, corpus_version, result,
+                                             sources=prepared['sources'])
+                # A query answered from BM25 alone has no embedding to cache under
+                if self.semantic_cache is not None and prepared['query_embedding'] is not None:
+                    self.semantic_cache.put(prepared['query_embedding'], result, corpus_version)
+            except Exception as e:
+                logger.warning("Caching the answer failed: %s", e)
@@ -0,0 +1,94 @@
+import faiss
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from app.config import SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES
+from app.utils import metrics
+
+class SemanticCache:
+    """Answer cache looked up by cosine similarity of query embeddings.
+
+    Paraphrases of a cached question ("what is X?" / "What is X") map to the
+    same answer without another LLM call. Entries are only valid for the
+    corpus version they were computed against; the first lookup that sees a
+    newer version drops the whole cache.
+    """
+
+    def __init__(self, dimension: int = 384, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.dimension = dimension
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self._entries = OrderedDict()  # entry id -> cached result, least recently used first
+        self._next_id = 0
+        self._corpus_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        metrics.register_collector("semantic_cache", {
+            "rag_semantic_cache_lookups_total": ("counter", "Semantic cache lookups by result"),
+            "rag_semantic_cache_entries": ("gauge", "Answers in the semantic cache")
+        }, lambda: [
+            ("rag_semantic_cache_lookups_total", {'result': 'hit'}, self.hits),
+            ("rag_semantic_cache_lookups_total", {'result': 'miss'}, self.misses),
+            ("rag_semantic_cache_entries", {}, len(self._entries))
+        ])
+
+    def _normalize(self, embedding: np.ndarray) -> np.ndarray:
+        vector = np.array(embedding, dtype='float32').reshape(1, self.dimension)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _sync_version(self, corpus_version: int):
+        if corpus_version == self._corpus_version:
+            return
+        if self._entries:
+            self.invalidations += 1
+        self._index.reset()
+        self._entries.clear()
+        self._corpus_version = corpus_version
+
+    def get(self, embedding: np.ndarray, corpus_version: int) -> Optional[Any]:
+        """Return the cached result of the most similar query above the threshold, if any."""
+        with self._lock:
+            self._sync_version(corpus_version)
+            if self._index.ntotal:
+                scores, ids = self._index.search(self._normalize(embedding), 1)
+                if ids[0][0] != -1 and scores[0][0] >= self.threshold:
+                    entry_id = int(ids[0][0])
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return self._entries[entry_id]
+            self.misses += 1
+            return None
+
+    def put(self, embedding: np.ndarray, result: Any, corpus_version: int):
+        """Cache a result; skipped if the corpus changed while it was being computed."""
+        with self._lock:
+            if corpus_version != self._corpus_version:
+                return
+            while len(self._entries) >= self.max_entries:
+                oldest_id, _ = self._entries.popitem(last=False)
+                self._index.remove_ids(np.array([oldest_id], dtype='int64'))
+                self.evictions += 1
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(self._normalize(embedding), np.array([entry_id], dtype='int64'))
+            self._entries[entry_id] = result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'threshold': self.threshold
+            }
@@ -0,0 +1,203 @@
+"""Process-wide registry of the heavy shared resources.
+
+Every resource (embedding model, FAISS index, storage clients, ...) is
+created lazily on first use and exactly once per process, so the upload
+and query paths share the same model and the same live index.
+
+When several serving processes run side by side (see ``gunicorn.conf.py``)
+exactly one of them is the writer: it runs the ingest workers and owns the
+FAISS index. The others serve queries from the writer's published snapshot
+and hand uploads to it through the Redis ingest queue.
+"""
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_instances: Dict[str, object] = {}
+_factories: Dict[str, Callable[[], object]] = {}
+_multi_process = False
+_writer_lock = None  # (pid, lock file or None) of the last role check
+
+def register(name: str, factory: Callable[[], object]):
+    """Register (or replace) the factory for a service; drops any existing instance."""
+    with _lock:
+        _factories[name] = factory
+        _instances.pop(name, None)
+
+def get(name: str):
+    """Return the shared instance of a service, creating it on first use.
+
+    Factories may return None for services that are disabled in the config.
+    """
+    if name in _instances:
+        return _instances[name]
+    with _lock:
+        if name not in _instances:
+            if name not in _factories:
+                raise KeyError(f"Unknown service: {name}")
+            logger.info("Creating service %s", name)
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+def warm_up(names: Optional[Iterable[str]] = None):
+    """Create services ahead of the first request (all registered ones by default)."""
+    for name in list(names or _factories):
+        get(name)
+
+def reset():
+    """Drop all instances; the next ``get`` recreates them."""
+    with _lock:
+        _instances.clear()
+
+def enable_multi_process():
+    """Switch to multi-process serving; call in the server's master process before forking."""
+    global _multi_process
+    _multi_process = True
+
+def is_writer() -> bool:
+    """Whether this process ingests documents and writes the FAISS index.
+
+    In single-process mode it always does. In multi-process mode the first
+    process to take an exclusive lock on ``WRITER_LOCK_PATH`` is the writer
+    until it exits; the lock is then free for its replacement.
+    """
+    global _writer_lock
+    if not _multi_process:
+        return True
+    with _lock:
+        # Checked per PID: a forked child must not inherit its parent's role
+        if _writer_lock is None or _writer_lock[0] != os.getpid():
+            import fcntl
+            from app.config import WRITER_LOCK_PATH
+            lock_file = open(WRITER_LOCK_PATH, "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                lock_file = None
+            _writer_lock = (os.getpid(), lock_file)
+            logger.info("Process %d serves as the index %s", os.getpid(), "writer" if lock_file else "reader")
+        return _writer_lock[1] is not None
+
+def _document_processor():
+    from app.core.chunker import TokenChunker
+    from app.core.document_processor import DocumentProcessor
+    # Size chunks with the embedding model's own tokenizer
+    return DocumentProcessor(TokenChunker(embedding_generator().tokenizer))
+
+def _embedding_generator():
+    from app.config import EMBEDDING_CACHE_ENABLED, EMBEDDING_THREADS, SERVER_WORKERS
+    from app.core.embeddings import EmbeddingGenerator
+    from app.storage.embedding_cache import EmbeddingCache
+    threads = EMBEDDING_THREADS
+    if _multi_process:
+        # Every worker process runs inference; share the cores between them
+        threads = max(1, EMBEDDING_THREADS // SERVER_WORKERS)
+    generator = EmbeddingGenerator(threads=threads)
+    if EMBEDDING_CACHE_ENABLED:
+        generator.cache = EmbeddingCache(generator.model_key)
+    return generator
+
+def _faiss_client():
+    from app.storage.faiss_client import FAISSClient
+    if not _multi_process:
+        return FAISSClient()
+    return FAISSClient(read_only=not is_writer(), redis_client=redis_client())
+
+def _es_client():
+    from app.storage.elasticsearch_client import ElasticsearchClient
+    return ElasticsearchClient()
+
+def _redis_client():
+    from app.storage.redis_client import RedisClient
+    return RedisClient()
+
+def _chunk_store():
+    from app.storage.chunk_store import ChunkStore
+    return ChunkStore() if is_writer() else None
+
+def _document_indexer():
+    from app.core.indexer import DocumentIndexer
+    if not is_writer():
+        return None
+    return DocumentIndexer(document_processor(), embedding_generator(), faiss_client(), es_client(),
+                           redis_client(), chunk_store())
+
+def _ingest_queue():
+    from app.config import INGEST_WORKERS
+    from app.core.jobs import IngestQueue
+    # Readers only enqueue uploads; the writer's workers index them
+    return IngestQueue(document_indexer(), redis_client(), workers=INGEST_WORKERS if is_writer() else 0)
+
+def _semantic_cache():
+    from app.config import SEMANTIC_CACHE_ENABLED
+    from app.core.semantic_cache import SemanticCache
+    return SemanticCache() if SEMANTIC_CACHE_ENABLED else None
+
+def _embedding_batcher():
+    from app.core.embedding_batcher import EmbeddingBatcher
+    return EmbeddingBatcher(embedding_generator())
+
+def _llm_client():
+    from app.config import LLM_SLOTS_DIR
+    from app.core.llm_client import OllamaClient
+    # Workers share Ollama, so they share its generation slots too
+    return OllamaClient(slots_dir=LLM_SLOTS_DIR if _multi_process else None)
+
+def _query_engine():
+    from app.core.query_engine import QueryEngine
+    return QueryEngine(embedding_generator(), faiss_client(), es_client(), redis_client(), semantic_cache(),
+                       embedding_batcher(), llm_client())
+
+register('document_processor', _document_processor)
+register('embedding_generator', _embedding_generator)
+register('faiss_client', _faiss_client)
+register('es_client', _es_client)
+register('redis_client', _redis_client)
+register('chunk_store', _chunk_store)
+register('document_indexer', _document_indexer)
+register('ingest_queue', _ingest_queue)
+register('semantic_cache', _semantic_cache)
+register('embedding_batcher', _embedding_batcher)
+register('llm_client', _llm_client)
+register('query_engine', _query_engine)
+
+def document_processor():
+    return get('document_processor')
+
+def embedding_generator():
+    return get('embedding_generator')
+
+def faiss_client():
+    return get('faiss_client')
+
+def es_client():
+    return get('es_client')
+
+def redis_client():
+    return get('redis_client')
+
+def chunk_store():
+    return get('chunk_store')
+
+def document_indexer():
+    return get('document_indexer')
+
+def ingest_queue():
+    return get('ingest_queue')
+
+def semantic_cache():
+    return get('semantic_cache')
+
+def embedding_batcher():
+    return get('embedding_batcher')
+
+def llm_client():
+    return get('llm_client')
+
+def query_engine():
+    return get('query_engine')
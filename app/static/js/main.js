@@ -23,13 +23,34 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             
             const result = await response.json();
-            addMessage('System', result.message);
+            const statusMessage = addMessage('System', result.message);
+            const job = await waitForJob(result.status_url, statusMessage);
+            if (job.status === 'failed') {
+                throw new Error(job.error);
+            }
+            statusMessage.textContent = `Document uploaded: ${job.source} (${job.chunks} chunks)`;
         } catch (error) {
             console.error('Upload error:', error);
             addMessage('System', `Error: ${error.message}`);
         }
     });
 
+    async function waitForJob(statusUrl, statusMessage) {
+        while (true) {
+            const response = await fetch(statusUrl);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const job = await response.json();
+            if (job.status === 'done' || job.status === 'failed') {
+                return job;
+            }
+            const pages = job.pages_total ? ` - page ${job.pages_done}/${job.pages_total}` : '';
+            statusMessage.textContent = `Indexing ${job.source}: ${job.stage}${pages}`;
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+
     async function sendQuery() {
         const query = queryInput.value.trim();
         if (!query) return;
@@ -38,7 +59,7 @@ document.addEventListener('DOMContentLoaded', function() {
         queryInput.value = '';
 
         try {
-            const response = await fetch('/api/query', {
+            const response = await fetch('/api/query/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -51,13 +72,42 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error(`Server error: ${errorData.error || response.statusText}`);
             }
             
-            const result = await response.json();
-            console.log('Search results:', result); // Debug log
+            // Server-Sent Events: one "data: {...}" line per event, blank line between events
+            const messageDiv = addMessage('Assistant', '');
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let answer = '';
+            
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const eventText of events) {
+                    if (!eventText.startsWith('data: ')) continue;
+                    const event = JSON.parse(eventText.slice(6));
+                    if (event.error) {
+                        throw new Error(`Server error: ${event.error}`);
+                    }
+                    if (event.token) {
+                        answer += event.token;
+                        messageDiv.textContent = answer;
+                        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                    }
+                    if (event.done) {
+                        console.log('Search results:', event); // Debug log
+                        if (event.results && event.results.length > 0) {
+                            messageDiv.textContent = event.results.join('\n');
+                        }
+                    }
+                }
+            }
             
-            if (result.results && result.results.length > 0) {
-                addMessage('Assistant', result.results);
-            } else {
-                addMessage('Assistant', 'No relevant information found.');
+            if (!messageDiv.textContent) {
+                messageDiv.textContent = 'No relevant information found.';
             }
         } catch (error) {
             console.error('Query error:', error);
@@ -78,6 +128,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         messagesContainer.appendChild(messageDiv);
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        return messageDiv;
     }
 
     sendButton.addEventListener('click', sendQuery);
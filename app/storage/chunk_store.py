@@ -0,0 +1,48 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from app.config import CHUNK_STORE_PATH
+
+class ChunkStore:
+    """Records which chunks (by ID and content hash) each source is indexed as.
+
+    Lets re-ingestion diff a document against what is already in FAISS and
+    Elasticsearch, so only new or changed chunks are embedded and removed
+    chunks are deleted.
+    """
+
+    def __init__(self, path=CHUNK_STORE_PATH):
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents (source TEXT PRIMARY KEY, content_hash TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "source TEXT NOT NULL, chunk_id INTEGER NOT NULL, content_hash TEXT NOT NULL, "
+                "PRIMARY KEY (source, chunk_id))")
+
+    def get_document_hash(self, source: str) -> Optional[str]:
+        """Hash of the file last indexed for ``source``, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash FROM documents WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def get_chunks(self, source: str) -> Dict[int, str]:
+        """Chunk ID -> content hash of every chunk currently indexed for ``source``."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id, content_hash FROM chunks WHERE source = ?", (source,)).fetchall()
+        return dict(rows)
+
+    def replace(self, source: str, chunks: Iterable[Tuple[int, str]], document_hash: Optional[str] = None):
+        """Atomically record the full chunk set of ``source``."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.executemany(
+                "INSERT INTO chunks (source, chunk_id, content_hash) VALUES (?, ?, ?)",
+                ((source, chunk_id, content_hash) for chunk_id, content_hash in chunks))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (source, content_hash) VALUES (?, ?)",
+                (source, document_hash))
@@ -1,17 +1,21 @@
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, helpers
 from elasticsearch.exceptions import ConnectionTimeout
 from datetime import datetime
-from typing import Dict, List
-from app.config import ELASTICSEARCH_HOST, ELASTICSEARCH_PORT, ELASTICSEARCH_INDEX
+from typing import Dict, Iterable, List
+from app.config import ELASTICSEARCH_HOST, ELASTICSEARCH_PORT, ELASTICSEARCH_INDEX, ES_BULK_BATCH_SIZE, QUERY_WORKERS
+import logging
 import time
 
+logger = logging.getLogger(__name__)
+
 class ElasticsearchClient:
     def __init__(self):
         self.es = Elasticsearch(
             "http://localhost:9200",
             timeout=30,  # Increase timeout to 30 seconds
             max_retries=3,  # Add retries
-            retry_on_timeout=True  # Retry on timeout
+            retry_on_timeout=True,  # Retry on timeout
+            maxsize=QUERY_WORKERS  # Pooled connections, one per concurrent query stage
         )
         self.index_name = "documents"
         self.create_index_if_not_exists()  # Call this in init
@@ -30,24 +34,35 @@ class ElasticsearchClient:
                         "properties": {
                             "content": {"type": "text"},
                             "metadata": {"type": "object"},
-                            "embedding_id": {"type": "integer"}
+                            "embedding_id": {"type": "long"}
                         }
                     }
                 }
                 
                 # Create the index
-                response = self.es.indices.create(
+                self.es.indices.create(
                     index=self.index_name,
                     body=index_settings
                 )
-                print(f"Index created successfully: {response}")
+                logger.info("Created Elasticsearch index %s", self.index_name)
             else:
-                print(f"Index {self.index_name} already exists")
-                
-        except Exception as e:
-            print(f"Error creating index: {e}")
+                logger.debug("Elasticsearch index %s already exists", self.index_name)
+                self._check_mapping()
+
+        except Exception:
+            logger.exception("Could not create Elasticsearch index %s", self.index_name)
             raise
     
+    def _check_mapping(self):
+        """Refuse an index created before chunk IDs were 63-bit: its integer embedding_id rejects them."""
+        mappings = self.es.indices.get_mapping(index=self.index_name)
+        for index, mapping in mappings.items():
+            field = mapping.get('mappings', {}).get('properties', {}).get('embedding_id', {})
+            if field.get('type', 'long') != 'long':
+                raise RuntimeError(
+                    f"Elasticsearch index {index} maps embedding_id as {field['type']}, which cannot hold "
+                    f"chunk IDs; delete it (DELETE /{index}) and re-upload the documents")
+
     def index_document(self, doc_id, content, metadata, embedding_id):
         max_retries = 3
         for attempt in range(max_retries):
@@ -62,21 +77,50 @@ class ElasticsearchClient:
                     id=doc_id,
                     document=document
                 )
-                print(f"Document indexed successfully on attempt {attempt + 1}: {response}")
+                logger.debug("Indexed document %s on attempt %d", doc_id, attempt + 1)
                 return response
             except ConnectionTimeout as e:
                 if attempt == max_retries - 1:  # Last attempt
-                    print(f"Final attempt failed: {e}")
+                    logger.error("Indexing document %s timed out %d times: %s", doc_id, max_retries, e)
                     raise
-                print(f"Timeout on attempt {attempt + 1}, retrying...")
+                logger.warning("Timeout indexing document %s on attempt %d, retrying", doc_id, attempt + 1)
                 time.sleep(2)  # Wait 2 seconds before retrying
-            except Exception as e:
-                print(f"Error indexing document: {e}")
+            except Exception:
+                logger.exception("Error indexing document %s", doc_id)
                 raise
+
+    def bulk_index_documents(self, documents: Iterable[Dict], batch_size: int = ES_BULK_BATCH_SIZE) -> int:
+        """Index many documents through the _bulk API.
+
+        Each document is a dict with ``doc_id``, ``content``, ``metadata`` and
+        ``embedding_id`` keys, mirroring the arguments of ``index_document``.
+        Returns the number of documents indexed.
+        """
+        actions = (
+            {
+                '_index': self.index_name,
+                '_id': doc['doc_id'],
+                '_source': {
+                    'content': doc['content'],
+                    'metadata': doc['metadata'],
+                    'embedding_id': doc['embedding_id']
+                }
+            }
+            for doc in documents
+        )
+        success, _ = helpers.bulk(
+            self.es,
+            actions,
+            chunk_size=batch_size,
+            max_retries=3,
+            initial_backoff=2
+        )
+        return success
     
-    def search(self, query: str, filter_: Dict = None) -> List[Dict]:
+    def search(self, query: str, filter_: Dict = None, size: int = 10) -> List[Dict]:
         """Search documents using text query and optional filters."""
         body = {
+            'size': size,
             'query': {
                 'bool': {
                     'must': [
@@ -92,6 +136,27 @@ class ElasticsearchClient:
         results = self.es.search(index=ELASTICSEARCH_INDEX, body=body)
         return results['hits']['hits']
     
+    def delete_documents(self, embedding_ids: Iterable[int], batch_size: int = ES_BULK_BATCH_SIZE) -> int:
+        """Delete chunks by embedding ID through the _bulk API; missing chunks are ignored."""
+        actions = (
+            {'_op_type': 'delete', '_index': self.index_name, '_id': str(embedding_id)}
+            for embedding_id in embedding_ids
+        )
+        success, _ = helpers.bulk(self.es, actions, chunk_size=batch_size, ignore_status=(404,))
+        return success
+
+    def get_documents(self, embedding_ids: List[int]) -> List[Dict]:
+        """Fetch chunks by embedding ID with one multi-get, preserving the given order.
+
+        Chunks are stored with ``_id`` equal to their embedding ID, so this is a
+        direct key lookup; IDs that are not found are skipped.
+        """
+        ids = [str(embedding_id) for embedding_id in embedding_ids]
+        if not ids:
+            return []
+        response = self.es.mget(index=self.index_name, body={'ids': ids})
+        return [doc for doc in response['docs'] if doc.get('found')]
+
     def get_document(self, doc_id: str) -> Dict:
         """Retrieve a document by its ID."""
         return self.es.get(index=ELASTICSEARCH_INDEX, id=doc_id)
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.config import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_LRU_SIZE, EMBEDDING_CACHE_MAX_BYTES
+from app.utils import metrics
+from app.utils.text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingCache:
+    """Embeddings keyed by (model, normalized text), in an LRU backed by a disk store.
+
+    The disk store is an append-only file of fixed-size records: a 16-byte
+    text hash, a CRC32 and the vector as float16. It is memory-mapped for
+    reads and indexed in memory by hash. Appends are single ``O_APPEND``
+    writes, so several processes can share the file; each picks up the
+    others' records when it misses. The store is emptied when the model
+    (name, backend or dimension) differs from the one that filled it.
+    """
+
+    def __init__(self, model_key: str, dimension: int = 384, path: Path = EMBEDDING_CACHE_DIR,
+                 lru_size: int = EMBEDDING_CACHE_LRU_SIZE, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.model_key = model_key
+        self.dimension = dimension
+        self.lru_size = lru_size
+        self.max_bytes = max_bytes
+        self.record = np.dtype([('key', 'V16'), ('crc', '<u4'), ('vector', '<f2', (dimension,))])
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._index: Dict[bytes, int] = {}  # Text hash -> record number
+        self._map = None
+        self._indexed = 0  # Records read into the index
+        self._lock = threading.Lock()
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        self.data_path = path / "embeddings.f16"
+        meta_path = path / "meta.json"
+        meta = {'model': model_key, 'dimension': dimension}
+        if not meta_path.exists() or json.loads(meta_path.read_text()) != meta:
+            if self.data_path.exists():
+                logger.info("Embedding model changed to %s; clearing the embedding cache", model_key)
+            self.data_path.write_bytes(b"")
+            meta_path.write_text(json.dumps(meta))
+        self._fd = os.open(self.data_path, os.O_RDWR | os.O_APPEND | os.O_CREAT)
+        with self._lock:
+            self._refresh()
+        metrics.register_collector("embedding_cache", {
+            "rag_embedding_cache_lookups_total": ("counter", "Embedding cache lookups by result"),
+            "rag_embedding_cache_entries": ("gauge", "Embeddings stored on disk")
+        }, lambda: [
+            ("rag_embedding_cache_lookups_total", {'result': 'memory_hit'}, self.hits),
+            ("rag_embedding_cache_lookups_total", {'result': 'disk_hit'}, self.disk_hits),
+            ("rag_embedding_cache_lookups_total", {'result': 'miss'}, self.misses),
+            ("rag_embedding_cache_entries", {}, len(self._index))
+        ])
+
+    def key(self, text: str) -> bytes:
+        return hashlib.blake2b(f"{self.model_key}\x00{normalize_text(text)}".encode('utf-8'),
+                               digest_size=16).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached embedding (float32) per text, or None for misses."""
+        keys = [self.key(text) for text in texts]
+        with self._lock:
+            results = [self._get(key) for key in keys]
+            if any(result is None for result in results) and self._refresh():
+                # Another process added records; look the misses up again
+                results = [result if result is not None else self._get(key)
+                           for key, result in zip(keys, results)]
+            for result in results:
+                if result is None:
+                    self.misses += 1
+        return results
+
+    def _get(self, key: bytes) -> Optional[np.ndarray]:
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+            self.hits += 1
+            return vector
+        position = self._index.get(key)
+        if position is None:
+            return None
+        record = self._map[position]
+        if zlib.crc32(record['vector'].tobytes()) != record['crc']:
+            # Torn write; drop it and recompute
+            del self._index[key]
+            return None
+        vector = record['vector'].astype('float32')
+        self._remember(key, vector)
+        self.disk_hits += 1
+        return vector
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        """Store embeddings for texts, in memory and on disk."""
+        records = np.zeros(len(texts), dtype=self.record)
+        keys = [self.key(text) for text in texts]
+        records['key'] = keys
+        records['vector'] = np.asarray(embeddings, dtype='float32').reshape(len(texts), self.dimension)
+        records['crc'] = [zlib.crc32(vector.tobytes()) for vector in records['vector']]
+        with self._lock:
+            for key, vector in zip(keys, records['vector']):
+                self._remember(key, vector.astype('float32'))
+            if (self._indexed + len(records)) * self.record.itemsize > self.max_bytes:
+                return
+            os.write(self._fd, records.tobytes())
+            self._refresh()
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _refresh(self) -> bool:
+        """Index records appended since the last refresh; returns True if there were any."""
+        count = os.fstat(self._fd).st_size // self.record.itemsize
+        if count <= self._indexed:
+            return False
+        self._map = np.memmap(self.data_path, dtype=self.record, mode='r', shape=(count,))
+        keys = np.ascontiguousarray(self._map['key'][self._indexed:count]).tobytes()
+        self._index.update((keys[i * 16:(i + 1) * 16], position)
+                           for i, position in enumerate(range(self._indexed, count)))
+        self._indexed = count
+        return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'model': self.model_key,
+                'memory_entries': len(self._lru),
+                'disk_entries': len(self._index),
+                'disk_bytes': self._indexed * self.record.itemsize,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
@@ -1,27 +1,672 @@
 import faiss
+import logging
 import numpy as np
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Tuple
-from app.config import FAISS_INDEX_PATH
+from typing import Iterator, Optional, Tuple
+from app.config import (
+    FAISS_INDEX_PATH, FAISS_WAL_PATH, FAISS_SNAPSHOT_INTERVAL, FAISS_WAL_MAX_BYTES, FAISS_INDEX_TYPE,
+    FAISS_RELOAD_POLL_INTERVAL,
+    FAISS_HNSW_M, FAISS_HNSW_EF_CONSTRUCTION, FAISS_HNSW_EF_SEARCH, FAISS_HNSW_MAX_DEAD_FRACTION,
+    FAISS_IVF_NLIST, FAISS_IVF_NPROBE, FAISS_PQ_M, FAISS_PQ_NBITS,
+    FAISS_IVF_MIN_TRAIN_SIZE, FAISS_IVF_MAX_TRAIN_SIZE
+)
+from app.storage.redis_client import RedisClient
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+# Write-ahead log record: operation, vector count, CRC32 of the payload. The
+# payload is the int64 IDs, followed by the float32 vectors for an addition.
+WAL_HEADER = struct.Struct("<cII")
+WAL_ADD = b"A"
+WAL_REMOVE = b"R"
+
+# The log starts with a magic number and the ID (inode, mtime) of the
+# snapshot its records continue, so readers only apply a log to its snapshot
+WAL_FILE_HEADER = struct.Struct("<4sQQ")
+WAL_MAGIC = b"FWAL"
+NO_SNAPSHOT = (0, 0)
+
+# HNSW graphs cannot delete nodes: removed vectors stay in the graph with
+# their ID set to DEAD_ID and are filtered out of search results
+DEAD_ID = -1
+LIVE_IDS = (0, 2 ** 63 - 1)  # Chunk IDs are non-negative
+
+def _fsync_dir(path: Path):
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class _ReadWriteLock:
+    """Any number of readers or one writer; a waiting writer holds off new readers."""
 
-class FAISSClient:
     def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+class FAISSClient:
+    """Vector index persisted as a memory-mapped snapshot plus a write-ahead log.
+
+    Every write is appended to the log (and fsynced on ``flush``) instead of
+    rewriting the index. Snapshots are written to a temporary file and
+    renamed over the previous one, so a crash leaves either the old or the
+    new snapshot, never a torn file; the log is then replaced by one holding
+    only the records written since. On startup the snapshot is loaded and
+    the log replayed on top. Replaying is idempotent, so a crash between the
+    two renames is harmless.
+
+    Snapshots are taken every ``snapshot_interval`` seconds after a write
+    and whenever the log outgrows ``FAISS_WAL_MAX_BYTES``. ``read_only``
+    instances (the other serving processes) memory-map the latest snapshot,
+    so its pages are shared through the page cache instead of copied into
+    every process, and apply the log written since on top: added vectors go
+    to a small in-memory index and replaced or removed ones are filtered out
+    of the snapshot's results. With ``redis_client`` the writer announces
+    every flushed write and snapshot so readers catch up at once; otherwise
+    they poll every ``FAISS_RELOAD_POLL_INTERVAL`` seconds.
+
+    Searches run concurrently with each other; writes, which modify the
+    index in place, wait for running searches and hold off new ones.
+    """
+
+    def __init__(self, snapshot_interval: float = FAISS_SNAPSHOT_INTERVAL, index_type: str = FAISS_INDEX_TYPE,
+                 index_path: Path = FAISS_INDEX_PATH, wal_path: Path = FAISS_WAL_PATH,
+                 read_only: bool = False, redis_client: Optional[RedisClient] = None):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported FAISS index type: {index_type}")
         self.dimension = 384  # Dimension of MiniLM embeddings
+        self.index_type = index_type
+        self.index_path = Path(index_path)
+        self.wal_path = Path(wal_path)
+        self.read_only = read_only
+        self.redis_client = redis_client
+        self._lock = threading.RLock()  # Log, snapshot and migration state
+        self._index_lock = _ReadWriteLock()  # Shared by searches, exclusive for changes to the index
+        self._dead = 0  # Removed vectors still in an HNSW graph
+        self._dirty = False  # Changes not in the snapshot yet
+        self._unsynced = False  # Log records not fsynced yet
+        self._snapshot_interval = snapshot_interval
+        self._snapshot_timer = None
+        self._snapshot_lock = threading.Lock()  # One snapshot at a time; never taken while holding _lock
+        self._migration = None
+        self._pending = None  # (vectors or None for a removal, ids) written during a migration
+        # Read-only instances: the log applied on top of the mapped snapshot
+        self._delta = None  # Vectors added since the snapshot
+        self._tombstones = np.empty(0, dtype='int64')  # Sorted IDs whose snapshot vectors are stale
+        self._wal_id = None  # (inode, offset) of the log position applied so far
+        metrics.register_collector("faiss", {
+            "rag_faiss_vectors": ("gauge", "Vectors in the live FAISS index")
+        }, lambda: [("rag_faiss_vectors", {'type': self._index_type_of(self.index)}, self.index.ntotal - self._dead)])
+        if read_only:
+            self._snapshot_id = None
+            self.index = self._build_index("flat")
+            self.reload()
+            threading.Thread(target=self._watch_updates, name="faiss-reload", daemon=True).start()
+            return
         self.index = self._load_or_create_index()
-    
+        self._replay_wal()
+        self._dead = self._dead_count(self.index)
+        self._wal = open(self.wal_path, "ab")
+        if self._wal_snapshot_id() != self._current_snapshot_id():
+            # The log predates the current snapshot (a crash between the two
+            # renames of a snapshot) or has no header: start one readers can use
+            if self._dirty:
+                self.snapshot()
+            else:
+                with self._lock:
+                    self._rotate_wal(self._wal_position(), self._current_snapshot_id())
+        self._maybe_migrate()
+
     def _load_or_create_index(self) -> faiss.Index:
-        """Load existing FAISS index or create a new one."""
-        if Path(FAISS_INDEX_PATH).exists():
-            return faiss.read_index(str(FAISS_INDEX_PATH))
-        
-        index = faiss.IndexFlatL2(self.dimension)
+        """Load existing FAISS index or create a new one.
+
+        Vectors are keyed by global 64-bit chunk IDs (``IndexIDMap2``, or the
+        native IDs of an IVF index) that are shared with Elasticsearch. Indexes
+        written before chunk IDs existed only carry sequential positions that
+        cannot be mapped back to documents, so they are set aside and the
+        documents have to be uploaded again.
+        """
+        path = self.index_path
+        if path.exists():
+            # The writer changes the index in place, so it reads the whole
+            # snapshot into memory; memory-mapped flat codes and inverted
+            # lists cannot grow. Read-only processes map it (_load_snapshot).
+            index = faiss.read_index(str(path))
+            if isinstance(index, (faiss.IndexIDMap2, faiss.IndexIVF)):
+                return index
+            legacy_path = path.with_name(path.name + ".legacy")
+            path.rename(legacy_path)
+            logger.warning("FAISS index at %s has no chunk IDs; moved it to %s, re-upload documents to rebuild it",
+                           path, legacy_path)
+
+        # IVF-PQ needs training data, so it starts out flat and migrates later
+        return self._build_index("flat" if self.index_type == "ivfpq" else self.index_type)
+
+    def _build_index(self, index_type: str, training_vectors: Optional[np.ndarray] = None) -> faiss.Index:
+        """Create an empty index of the given type (IVF-PQ is trained on ``training_vectors``)."""
+        if index_type == "flat":
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+        if index_type == "hnsw":
+            hnsw = faiss.IndexHNSWFlat(self.dimension, FAISS_HNSW_M)
+            hnsw.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+            hnsw.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+            return faiss.IndexIDMap2(hnsw)
+
+        quantizer = faiss.IndexFlatL2(self.dimension)
+        ivf = faiss.IndexIVFPQ(quantizer, self.dimension, FAISS_IVF_NLIST, FAISS_PQ_M, FAISS_PQ_NBITS)
+        ivf.nprobe = FAISS_IVF_NPROBE
+        if len(training_vectors) > FAISS_IVF_MAX_TRAIN_SIZE:
+            sample = np.random.default_rng(0).choice(len(training_vectors), FAISS_IVF_MAX_TRAIN_SIZE, replace=False)
+            training_vectors = training_vectors[sample]
+        ivf.train(training_vectors)
+        # Hash-table direct map keeps remove_ids/reconstruct O(1) per ID
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return ivf
+
+    def _current_snapshot_id(self) -> Tuple[int, int]:
+        try:
+            stat = self.index_path.stat()
+        except FileNotFoundError:
+            return NO_SNAPSHOT
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _wal_snapshot_id(self) -> Optional[Tuple[int, int]]:
+        """Snapshot ID in the log's header (None without a header)."""
+        try:
+            with open(self.wal_path, "rb") as f:
+                header = f.read(WAL_FILE_HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(header) < WAL_FILE_HEADER.size or header[:4] != WAL_MAGIC:
+            return None
+        return WAL_FILE_HEADER.unpack(header)[1:]
+
+    def _load_snapshot(self) -> faiss.Index:
+        """Map the published snapshot read-only (an empty index if there is none yet).
+
+        Flat codes (flat and HNSW indexes) are mapped in place with
+        ``IO_FLAG_MMAP_IFC``, IVF inverted lists with ``IO_FLAG_MMAP``. Only
+        small structures (ID table, HNSW graph links) are read into memory.
+        """
+        if not self.index_path.exists():
+            return self._build_index("flat")
+        with open(self.index_path, "rb") as f:
+            ivf = f.read(2) == b"Iw"  # IVF index fourccs ("IwPQ", "IwFl", ...)
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if ivf else faiss.IO_FLAG_MMAP_IFC
+        return faiss.read_index(str(self.index_path), flags)
+
+    def reload(self) -> bool:
+        """Bring a read-only instance up to date; returns False if nothing changed.
+
+        Switches to a newer snapshot if one was published, then applies the
+        log records written since.
+        """
+        changed = False
+        snapshot_id = self._current_snapshot_id()
+        if snapshot_id != self._snapshot_id:
+            index = self._load_snapshot()
+            with self._lock, self._index_lock.write():
+                self.index = index
+                self._dead = self._dead_count(index)
+                self._snapshot_id = snapshot_id
+                self._delta = self._build_index("flat")
+                self._tombstones = np.empty(0, dtype='int64')
+                self._wal_id = None
+            logger.info("Loaded FAISS snapshot (%d vectors)", index.ntotal)
+            changed = True
+        return self._catch_up() or changed
+
+    def _catch_up(self) -> bool:
+        """Apply the records appended to the log of this reader's snapshot since the last call."""
+        try:
+            f = open(self.wal_path, "rb")
+        except FileNotFoundError:
+            return False
+        with f:
+            header = f.read(WAL_FILE_HEADER.size)
+            if len(header) < WAL_FILE_HEADER.size or header[:4] != WAL_MAGIC or \
+                    WAL_FILE_HEADER.unpack(header)[1:] != self._snapshot_id:
+                return False  # The log of an older or a newer snapshot; the next reload sorts it out
+            inode = os.fstat(f.fileno()).st_ino
+            if self._wal_id is not None and self._wal_id[0] == inode:
+                f.seek(self._wal_id[1])
+            records = list(self._read_wal(f))
+        if not records:
+            return False
+        with self._lock, self._index_lock.write():
+            for op, ids, vectors, _ in records:
+                # Snapshot vectors of these IDs are stale; the delta holds their current versions
+                self._tombstones = np.union1d(self._tombstones, ids)
+                self._delta.remove_ids(ids)
+                if op == WAL_ADD:
+                    self._delta.add_with_ids(vectors, ids)
+            self._wal_id = (inode, records[-1][3])
+        logger.debug("Applied %d FAISS log records", len(records))
+        return True
+
+    def _watch_updates(self):
+        """Catch up on every update announcement, polling the files as a fallback."""
+        pubsub = None
+        while True:
+            try:
+                if self.redis_client is None:
+                    time.sleep(FAISS_RELOAD_POLL_INTERVAL)
+                else:
+                    if pubsub is None:
+                        pubsub = self.redis_client.subscribe_index_updates()
+                    pubsub.get_message(ignore_subscribe_messages=True, timeout=FAISS_RELOAD_POLL_INTERVAL)
+            except Exception as e:
+                logger.debug("Index update announcements unavailable (%s); polling", e)
+                pubsub = None
+                time.sleep(FAISS_RELOAD_POLL_INTERVAL)
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Could not reload the FAISS index")
+
+    def _announce(self):
+        if self.redis_client is None:
+            return
+        try:
+            self.redis_client.publish_index_update()
+        except Exception as e:
+            logger.warning("Could not announce the FAISS update (%s); readers will poll for it", e)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("The FAISS index is read-only in this process")
+
+    def _wal_position(self) -> int:
+        self._wal.flush()
+        return self._wal.tell()
+
+    def _replay_wal(self):
+        """Apply the log written since the last snapshot, dropping a torn tail."""
+        if not self.wal_path.exists():
+            return
+        replayed = 0
+        with open(self.wal_path, "rb") as f:
+            # Logs written before the header was introduced start with a record
+            if f.read(len(WAL_MAGIC)) == WAL_MAGIC:
+                f.seek(WAL_FILE_HEADER.size)
+            else:
+                f.seek(0)
+            valid_bytes = f.tell()
+            for op, ids, vectors, end in self._read_wal(f):
+                if op == WAL_ADD:
+                    self.index = self._add_to(self.index, vectors, ids)
+                else:
+                    self.index = self._remove_from(self.index, ids)
+                replayed += 1
+                valid_bytes = end
+        if valid_bytes < self.wal_path.stat().st_size:
+            logger.warning("Discarding a truncated or corrupt record at the end of %s", self.wal_path)
+            with open(self.wal_path, "r+b") as f:
+                f.truncate(valid_bytes)
+                os.fsync(f.fileno())
+        if replayed:
+            logger.info("Replayed %d FAISS log records from %s", replayed, self.wal_path)
+            self._dirty = True
+
+    def _read_wal(self, f) -> Iterator[Tuple[bytes, np.ndarray, Optional[np.ndarray], int]]:
+        """Yield (operation, ids, vectors, end offset) for every intact log record from f's position."""
+        while True:
+            header = f.read(WAL_HEADER.size)
+            if len(header) < WAL_HEADER.size:
+                return
+            op, count, checksum = WAL_HEADER.unpack(header)
+            if op not in (WAL_ADD, WAL_REMOVE):
+                return
+            size = count * 8 + (count * self.dimension * 4 if op == WAL_ADD else 0)
+            payload = f.read(size)
+            if len(payload) < size or zlib.crc32(payload) != checksum:
+                return
+            ids = np.frombuffer(payload, dtype='int64', count=count)
+            vectors = None
+            if op == WAL_ADD:
+                vectors = np.frombuffer(payload, dtype='float32', offset=count * 8).reshape(count, self.dimension)
+            yield op, ids, vectors, f.tell()
+
+    def _log(self, op: bytes, ids: np.ndarray, vectors: Optional[np.ndarray] = None):
+        payload = ids.tobytes() if vectors is None else ids.tobytes() + vectors.tobytes()
+        self._wal.write(WAL_HEADER.pack(op, len(ids), zlib.crc32(payload)) + payload)
+        self._unsynced = True
+        self._dirty = True
+
+    @staticmethod
+    def _index_type_of(index: faiss.Index) -> str:
+        if isinstance(index, faiss.IndexIVF):
+            return "ivfpq"
+        if isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW):
+            return "hnsw"
+        return "flat"
+
+    @staticmethod
+    def _id_map(index: faiss.Index) -> np.ndarray:
+        """Writable view of an IndexIDMap2's position -> chunk ID table."""
+        if not index.ntotal:
+            return np.empty(0, dtype='int64')
+        return faiss.rev_swig_ptr(index.id_map.data(), index.id_map.size())
+
+    def _dead_count(self, index: faiss.Index) -> int:
+        if self._index_type_of(index) != "hnsw":
+            return 0
+        return int(np.count_nonzero(self._id_map(index) == DEAD_ID))
+
+    def _export(self, index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, vectors) of the live vectors of an IndexIDMap2-backed index."""
+        ids = self._id_map(index).copy()
+        vectors = index.index.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, index.d), 'float32')
+        live = ids != DEAD_ID
+        return ids[live], vectors[live]
+
+    @staticmethod
+    def _present(index: faiss.Index, ids: np.ndarray) -> np.ndarray:
+        """The subset of ``ids`` held by ``index``, found by per-ID lookups instead of a scan.
+
+        Tombstoned HNSW IDs still resolve; removing them again is harmless.
+        """
+        if isinstance(index, faiss.IndexIVF) and index.direct_map.type == faiss.DirectMap.NoMap:
+            return ids  # No ID lookup; let remove_ids sort it out
+        present = []
+        for chunk_id in ids.tolist():
+            try:
+                index.reconstruct(chunk_id)
+            except RuntimeError:
+                continue
+            present.append(chunk_id)
+        return np.array(present, dtype='int64')
+
+    def _add_to(self, index: faiss.Index, embeddings: np.ndarray, ids: np.ndarray,
+                present: Optional[np.ndarray] = None) -> faiss.Index:
+        """Add under ``ids``, replacing the ``present`` ones (looked up if not given)."""
+        if present is None:
+            present = self._present(index, ids)
+        if len(present):
+            index = self._remove_from(index, present)
+        index.add_with_ids(embeddings, ids)
+        return index
+
+    def _remove_from(self, index: faiss.Index, ids: np.ndarray) -> faiss.Index:
+        if isinstance(index, faiss.IndexIVF):
+            index.remove_ids(faiss.IDSelectorArray(ids))
+        elif self._index_type_of(index) == "hnsw":
+            # Tombstone the nodes; _migrate rebuilds the graph once too many are dead
+            id_map = self._id_map(index)
+            id_map[np.isin(id_map, ids)] = DEAD_ID
+        else:
+            index.remove_ids(ids)
         return index
-    
-    def add_embeddings(self, embeddings: np.ndarray):
-        """Add embeddings to the index."""
-        self.index.add(embeddings)
-        faiss.write_index(self.index, str(FAISS_INDEX_PATH))
-    
-    def search(self, query_embedding: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
-        """Search for similar embeddings."""
-        return self.index.search(query_embedding.reshape(1, -1), k) 
\ No newline at end of file
+
+    def add_embeddings(self, embeddings: np.ndarray, ids: np.ndarray, flush: bool = True):
+        """Add a batch of embeddings under the given chunk IDs.
+
+        IDs that are already present are replaced. The batch is appended to
+        the write-ahead log; with ``flush=False`` it only becomes durable on
+        the next ``flush()`` call or snapshot.
+        """
+        self._check_writable()
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32').reshape(-1, self.dimension)
+        ids = np.ascontiguousarray(ids, dtype='int64')
+        with self._lock:
+            self._log(WAL_ADD, ids, embeddings)
+            with self._index_lock.write():
+                replaced = self._present(self.index, ids)
+                self.index = self._add_to(self.index, embeddings, ids, replaced)
+                if len(replaced):
+                    self._dead = self._dead_count(self.index)
+            if self._pending is not None:
+                self._pending.append((embeddings, ids))
+        self._after_write(flush)
+
+    def _after_write(self, flush: bool):
+        """Called without holding ``_lock``, since it may snapshot."""
+        if flush:
+            self.flush()
+        self._maybe_snapshot()
+        self._schedule_snapshot()
+        self._maybe_migrate()
+
+    def _maybe_snapshot(self):
+        """Snapshot right away once the log outgrows ``FAISS_WAL_MAX_BYTES``."""
+        with self._lock:
+            oversized = self._wal_position() >= FAISS_WAL_MAX_BYTES
+        if oversized:
+            self.snapshot()
+
+    def flush(self) -> bool:
+        """Make logged writes durable (fsync the log) and announce them to readers.
+
+        Returns False if there was nothing to sync.
+        """
+        with self._lock:
+            if not self._unsynced:
+                return False
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+            self._unsynced = False
+        self._announce()
+        return True
+
+    def snapshot(self) -> bool:
+        """Atomically replace the snapshot with the live index and drop the log records it covers.
+
+        Only serializing the index to memory holds up writes (searches go on);
+        the file is written and fsynced without holding any lock. Records
+        logged meanwhile are carried over into the new log.
+        """
+        with self._snapshot_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                position = self._wal_position()
+                with self._index_lock.read():
+                    data = faiss.serialize_index(self.index)
+                self._dirty = False
+            try:
+                tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                del data
+                os.replace(tmp_path, self.index_path)
+                _fsync_dir(self.index_path.parent)
+                with self._lock:
+                    self._rotate_wal(position, self._current_snapshot_id())
+            except BaseException:
+                self._dirty = True
+                raise
+        self._announce()
+        return True
+
+    def _rotate_wal(self, position: int, snapshot_id: Tuple[int, int]):
+        """Replace the log with one for ``snapshot_id`` holding only the records from ``position`` on."""
+        self._wal.flush()
+        with open(self.wal_path, "rb") as f:
+            f.seek(position)
+            tail = f.read()
+        tmp_path = self.wal_path.with_name(self.wal_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(WAL_FILE_HEADER.pack(WAL_MAGIC, *snapshot_id) + tail)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.wal_path)
+        _fsync_dir(self.wal_path.parent)
+        self._wal.close()
+        self._wal = open(self.wal_path, "ab")
+        self._unsynced = False
+
+    def _schedule_snapshot(self):
+        with self._lock:
+            if self._snapshot_interval <= 0 or self._snapshot_timer is not None or not self._dirty:
+                return
+            self._snapshot_timer = threading.Timer(self._snapshot_interval, self._timed_snapshot)
+            self._snapshot_timer.daemon = True
+            self._snapshot_timer.start()
+
+    def _timed_snapshot(self):
+        with self._lock:
+            self._snapshot_timer = None
+        try:
+            self.snapshot()
+        except Exception:
+            logger.exception("FAISS snapshot failed; the write-ahead log still holds the changes")
+
+    def _maybe_migrate(self):
+        """Start a background rebuild if the live index is not the configured type yet.
+
+        An HNSW index is also rebuilt once more than
+        ``FAISS_HNSW_MAX_DEAD_FRACTION`` of its nodes are removed vectors.
+        """
+        if self.read_only:
+            return
+        with self._lock:
+            if self._migration is not None:
+                return
+            if self._index_type_of(self.index) == self.index_type and \
+                    self._dead <= FAISS_HNSW_MAX_DEAD_FRACTION * self.index.ntotal:
+                return
+            if isinstance(self.index, faiss.IndexIVF):
+                logger.warning("Cannot migrate an IVF-PQ index to %s; re-upload documents to rebuild it", self.index_type)
+                return
+            if self.index_type == "ivfpq" and self.index.ntotal < FAISS_IVF_MIN_TRAIN_SIZE:
+                return
+            self._pending = []
+            self._migration = threading.Thread(target=self._migrate, name="faiss-migrate", daemon=True)
+            self._migration.start()
+
+    def _migrate(self):
+        """Build the configured index from the live one and swap it in.
+
+        Queries keep using the old index while the new one is trained and
+        filled; writes made in the meantime are replayed before the swap.
+        """
+        try:
+            with self._lock, self._index_lock.read():
+                ids, vectors = self._export(self.index)
+            logger.info("Rebuilding FAISS index (%d vectors) as %s", len(ids), self.index_type)
+            index = self._build_index(self.index_type, vectors)
+            if len(ids):
+                index.add_with_ids(vectors, ids)
+            with self._lock:
+                for pending_vectors, pending_ids in self._pending:
+                    if pending_vectors is None:
+                        index = self._remove_from(index, pending_ids)
+                    else:
+                        index = self._add_to(index, pending_vectors, pending_ids)
+                with self._index_lock.write():
+                    self.index = index
+                    self._dead = self._dead_count(index)
+                self._dirty = True
+            self.snapshot()
+            logger.info("FAISS index rebuilt as %s", self.index_type)
+        except Exception:
+            logger.exception("FAISS index rebuild as %s failed", self.index_type)
+        finally:
+            with self._lock:
+                self._pending = None
+                self._migration = None
+
+    def remove_ids(self, ids: np.ndarray, flush: bool = True) -> int:
+        """Remove vectors by chunk ID and return how many were removed."""
+        self._check_writable()
+        ids = np.ascontiguousarray(ids, dtype='int64')
+        with self._lock:
+            with self._index_lock.write():
+                before = self.index.ntotal - self._dead
+                self.index = self._remove_from(self.index, ids)
+                self._dead = self._dead_count(self.index)
+                removed = before - (self.index.ntotal - self._dead)
+            if self._pending is not None:
+                self._pending.append((None, ids))
+            if removed:
+                self._log(WAL_REMOVE, ids)
+        if removed:
+            self._after_write(flush)
+        return removed
+
+    def search(self, query_embedding: np.ndarray, k: int = 5, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Search for similar embeddings; returns (distances, chunk IDs), -1 marks empty slots.
+
+        ``nprobe`` (IVF-PQ) and ``ef_search`` (HNSW) override the configured
+        accuracy/speed trade-off for this query only.
+        """
+        query = np.ascontiguousarray(query_embedding, dtype='float32').reshape(1, -1)
+        with self._index_lock.read():
+            index = self.index
+            # Skip dead HNSW nodes and, on readers, snapshot vectors the log replaced
+            selectors = []
+            if self._dead:
+                selectors.append(faiss.IDSelectorRange(*LIVE_IDS))
+            if len(self._tombstones):
+                selectors.append(faiss.IDSelectorBatch(self._tombstones))
+                selectors.append(faiss.IDSelectorNot(selectors[-1]))
+                if self._dead:
+                    selectors.append(faiss.IDSelectorAnd(selectors[0], selectors[-1]))
+            selector = selectors[-1] if selectors else None  # The others must stay referenced
+
+            params = None
+            if isinstance(index, faiss.IndexIVF):
+                if nprobe is not None or selector is not None:
+                    params = faiss.SearchParametersIVF(sel=selector)
+                    params.nprobe = int(nprobe) if nprobe is not None else index.nprobe
+            elif self._index_type_of(index) == "hnsw":
+                if ef_search is not None or selector is not None:
+                    params = faiss.SearchParametersHNSW(sel=selector)
+                    params.efSearch = int(ef_search) if ef_search is not None else \
+                        faiss.downcast_index(index.index).hnsw.efSearch
+            elif selector is not None:
+                params = faiss.SearchParameters(sel=selector)
+            distances, ids = index.search(query, k, params=params)
+
+            if self._delta is not None and self._delta.ntotal:
+                delta_distances, delta_ids = self._delta.search(query, k)
+                distances = np.hstack([distances, delta_distances])
+                ids = np.hstack([ids, delta_ids])
+                order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+                distances = np.take_along_axis(distances, order, axis=1)
+                ids = np.take_along_axis(ids, order, axis=1)
+            return distances, ids
@@ -1,7 +1,19 @@
 import redis
-import json
-from typing import Any, Optional
-from app.config import REDIS_HOST, REDIS_PORT, REDIS_DB
+import hashlib
+import msgpack
+import zlib
+from typing import Any, Iterable, Optional
+from app.config import REDIS_HOST, REDIS_PORT, REDIS_DB, CACHE_TTL, CACHE_COMPRESS_MIN_BYTES
+from app.utils.text_utils import normalize_query
+
+CORPUS_VERSION_KEY = "corpus:version"
+ANSWER_KEY_PREFIX = "qa:"
+SOURCE_KEY_PREFIX = "qa:src:"
+INDEX_UPDATE_CHANNEL = "faiss:updates"
+
+# First byte of every cached value tells how the rest is encoded
+_RAW = b"\x00"
+_ZLIB = b"\x01"
 
 class RedisClient:
     def __init__(self):
@@ -10,16 +22,83 @@ class RedisClient:
             port=REDIS_PORT,
             db=REDIS_DB
         )
-    
-    def set_cache(self, key: str, value: Any, expire: int = 3600):
+
+    @staticmethod
+    def _dumps(value: Any) -> bytes:
+        payload = msgpack.packb(value, use_bin_type=True)
+        if len(payload) >= CACHE_COMPRESS_MIN_BYTES:
+            return _ZLIB + zlib.compress(payload)
+        return _RAW + payload
+
+    @staticmethod
+    def _loads(data: bytes) -> Any:
+        payload = zlib.decompress(data[1:]) if data[:1] == _ZLIB else data[1:]
+        return msgpack.unpackb(payload, raw=False)
+
+    def set_cache(self, key: str, value: Any, expire: int = CACHE_TTL):
         """Set cache with expiration time."""
         self.redis.setex(
             key,
             expire,
-            json.dumps(value)
+            self._dumps(value)
         )
-    
+
     def get_cache(self, key: str) -> Optional[Any]:
         """Get cached value."""
         value = self.redis.get(key)
-        return json.loads(value) if value else None 
\ No newline at end of file
+        return self._loads(value) if value else None
+
+    def publish_index_update(self) -> int:
+        """Tell the other serving processes that the FAISS log or snapshot changed."""
+        return self.redis.publish(INDEX_UPDATE_CHANNEL, b"1")
+
+    def subscribe_index_updates(self) -> redis.client.PubSub:
+        """Subscription that receives a message for every announced FAISS update."""
+        pubsub = self.redis.pubsub()
+        pubsub.subscribe(INDEX_UPDATE_CHANNEL)
+        return pubsub
+
+    def get_corpus_version(self) -> int:
+        """Current corpus version; bumped every time documents are ingested."""
+        value = self.redis.get(CORPUS_VERSION_KEY)
+        return int(value) if value else 0
+
+    def bump_corpus_version(self) -> int:
+        """Atomically advance the corpus version and return the new value."""
+        return self.redis.incr(CORPUS_VERSION_KEY)
+
+    @staticmethod
+    def answer_key(query: str, model: str, corpus_version: int) -> str:
+        """Compact cache key for an answer: hash of the normalized query, model and corpus version."""
+        digest = hashlib.blake2b(
+            f"{model}\x00{corpus_version}\x00{normalize_query(query)}".encode("utf-8"),
+            digest_size=16
+        ).hexdigest()
+        return ANSWER_KEY_PREFIX + digest
+
+    def get_answer(self, query: str, model: str, corpus_version: int) -> Optional[Any]:
+        """Cached answer for a query against the given corpus version."""
+        return self.get_cache(self.answer_key(query, model, corpus_version))
+
+    def set_answer(self, query: str, model: str, corpus_version: int, value: Any,
+                   sources: Iterable[str] = (), expire: int = CACHE_TTL):
+        """Cache an answer and record which sources fed it for ``invalidate_source``."""
+        key = self.answer_key(query, model, corpus_version)
+        pipe = self.redis.pipeline()
+        pipe.setex(key, expire, self._dumps(value))
+        for source in set(sources):
+            source_key = SOURCE_KEY_PREFIX + source
+            pipe.sadd(source_key, key)
+            pipe.expire(source_key, expire)
+        pipe.execute()
+
+    def invalidate_source(self, source: str) -> int:
+        """Drop every cached answer built from chunks of ``source``; returns how many were dropped."""
+        source_key = SOURCE_KEY_PREFIX + source
+        keys = self.redis.smembers(source_key)
+        pipe = self.redis.pipeline()
+        if keys:
+            pipe.delete(*keys)
+        pipe.delete(source_key)
+        results = pipe.execute()
+        return results[0] if keys else 0
@@ -0,0 +1,208 @@
+"""In-process metrics with Prometheus text exposition (served at /api/metrics).
+
+Under a multi-process server each worker has its own registry; after
+``enable_multi_process`` the workers share their samples through files so
+that any of them can render the totals.
+"""
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers cache lookups (sub-millisecond) to LLM generations (minutes)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+class Histogram:
+    """Thread-safe histogram with fixed upper bounds (cumulative, Prometheus style)."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+
+    def snapshot(self) -> Dict:
+        """``{'buckets': {upper bound: cumulative count}, 'count', 'sum'}``."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip([*map(str, self.buckets), '+Inf'], counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {'buckets': buckets, 'count': cumulative, 'sum': total}
+
+# A sample is (metric name, labels, value); a collector returns the current samples
+Sample = Tuple[str, Dict[str, str], float]
+
+_lock = threading.Lock()
+_histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+_meta: Dict[str, Tuple[str, str]] = {}  # Metric name -> (type, help)
+_collectors: Dict[str, Callable[[], Iterable[Sample]]] = {}
+_shared_dir: Optional[Path] = None
+
+def histogram(name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS, **labels) -> Histogram:
+    """The histogram for ``name`` and ``labels``, created on first use."""
+    key = (name, tuple(sorted(labels.items())))
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.get(key)
+            if histogram is None:
+                histogram = _histograms[key] = Histogram(buckets)
+                _meta.setdefault(name, ('histogram', help))
+    return histogram
+
+def register_histogram(name: str, help: str, histogram: Histogram, **labels):
+    """Expose a histogram owned by another component."""
+    with _lock:
+        _histograms[(name, tuple(sorted(labels.items())))] = histogram
+        _meta.setdefault(name, ('histogram', help))
+
+def register_collector(key: str, metrics: Dict[str, Tuple[str, str]], collector: Callable[[], Iterable[Sample]]):
+    """Expose gauges/counters read at scrape time; ``metrics`` maps name -> (type, help).
+
+    Registering again under the same ``key`` replaces the previous collector.
+    """
+    with _lock:
+        for name, meta in metrics.items():
+            _meta.setdefault(name, meta)
+        _collectors[key] = collector
+
+def enable_multi_process(directory: Path, interval: float):
+    """Share this process's metrics with the other workers through ``directory``.
+
+    The process writes its samples to ``<directory>/<pid>.json`` every
+    ``interval`` seconds and on exit, and ``render`` serves the sum over all
+    the files: histograms and counters are added up, including those of
+    workers that have exited, while gauges get a ``pid`` label and disappear
+    with their worker. Other workers' values are up to ``interval`` old.
+    Call in each worker after the fork; empty ``directory`` when the server starts.
+    """
+    global _shared_dir
+    directory.mkdir(parents=True, exist_ok=True)
+    _shared_dir = directory
+
+    def share():
+        while True:
+            time.sleep(interval)
+            try:
+                _write(_snapshot())
+            except Exception:
+                logger.exception("Sharing metrics failed")
+
+    threading.Thread(target=share, name="metrics-share", daemon=True).start()
+    atexit.register(lambda: _write(_snapshot()))
+
+def _snapshot() -> Dict:
+    """This process's metric values, in a JSON-serializable form."""
+    with _lock:
+        histograms = sorted(_histograms.items())
+        collectors = list(_collectors.values())
+        meta = dict(_meta)
+    return {
+        'meta': meta,
+        'histograms': [[name, list(labels), histogram.snapshot()] for (name, labels), histogram in histograms],
+        'samples': [[name, labels, value] for collector in collectors for name, labels, value in collector()]
+    }
+
+def _write(snapshot: Dict):
+    path = _shared_dir / f"{os.getpid()}.json"
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(snapshot))
+    os.replace(temporary, path)
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _merged(current: Dict) -> Dict:
+    """``current`` plus the shared snapshots of the other workers."""
+    snapshots = [(os.getpid(), current)]
+    for path in _shared_dir.glob("*.json"):
+        pid = int(path.stem)
+        if pid == os.getpid():
+            continue
+        try:
+            snapshots.append((pid, json.loads(path.read_text())))
+        except (OSError, ValueError):
+            logger.warning("Skipping unreadable metrics file %s", path)
+
+    meta = {}
+    histograms: Dict[Tuple, Dict] = {}
+    samples: Dict[Tuple, float] = {}
+    for pid, snapshot in snapshots:
+        for name, value in snapshot['meta'].items():
+            meta.setdefault(name, tuple(value))
+        for name, labels, histogram in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.get(key)
+            if total is None:
+                histograms[key] = {**histogram, 'buckets': dict(histogram['buckets'])}
+                continue
+            for bound, count in histogram['buckets'].items():
+                total['buckets'][bound] = total['buckets'].get(bound, 0) + count
+            total['count'] += histogram['count']
+            total['sum'] += histogram['sum']
+        live = pid == os.getpid() or _alive(pid)
+        for name, labels, value in snapshot['samples']:
+            if meta.get(name, ('untyped', ''))[0] == 'gauge':
+                if not live:
+                    continue
+                labels = {**labels, 'pid': str(pid)}
+            key = (name, tuple(sorted(labels.items())))
+            samples[key] = samples.get(key, 0) + value
+    return {
+        'meta': meta,
+        'histograms': [[name, list(labels), histogram] for (name, labels), histogram in sorted(histograms.items())],
+        'samples': [[name, dict(labels), value] for (name, labels), value in samples.items()]
+    }
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def render() -> str:
+    """All metrics (of every worker, in multi-process mode) in the Prometheus text exposition format."""
+    snapshot = _snapshot()
+    if _shared_dir is not None:
+        snapshot = _merged(snapshot)
+
+    samples: Dict[str, List[str]] = {}
+    for name, labels, histogram in snapshot['histograms']:
+        labels = tuple(map(tuple, labels))
+        lines = samples.setdefault(name, [])
+        for bound, count in histogram['buckets'].items():
+            lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram['sum']}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram['count']}")
+    for name, labels, value in snapshot['samples']:
+        samples.setdefault(name, []).append(f"{name}{_labels(sorted(labels.items()))} {value}")
+
+    meta = snapshot['meta']
+    output = []
+    for name, lines in samples.items():
+        kind, help = meta.get(name, ('untyped', ''))
+        output.append(f"# HELP {name} {help}")
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(lines)
+    return "\n".join(output) + "\n"
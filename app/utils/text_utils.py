@@ -0,0 +1,11 @@
+import re
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace runs and trim, leaving the text otherwise as the model sees it."""
+    return _WHITESPACE.sub(" ", text).strip()
+
+def normalize_query(text: str) -> str:
+    """Normalize a query for cache keys: case-fold, collapse whitespace, drop trailing punctuation."""
+    return _WHITESPACE.sub(" ", text).strip().casefold().rstrip("?.!").rstrip()
@@ -0,0 +1,74 @@
+"""Lightweight request tracing.
+
+``span(name)`` times a block of code and records it in the
+``rag_stage_seconds`` histogram (per stage) and, if a trace is active, in
+that trace, so a response can carry its own timing breakdown. Work handed
+to a thread pool joins the caller's trace when the callable is wrapped
+with ``bind``.
+
+Spans nest, so stage timings overlap rather than add up: ``query`` (and
+``query_stream``) covers the whole request, ``vector_search`` covers
+``embed``, ``semantic_cache`` and ``faiss_search``, ``llm_generate``
+covers ``llm_first_token`` and ``ingest`` covers the ``ingest_*`` stages.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Dict, Iterator, Optional
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+STAGE_METRIC = "rag_stage_seconds"
+STAGE_HELP = "Time spent per pipeline stage (stages nest; see app.utils.tracing)"
+
+class Trace:
+    """Stage timings (seconds, summed per stage) collected during one request."""
+
+    def __init__(self):
+        self.spans: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def as_millis(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage: round(seconds * 1000, 3) for stage, seconds in self.spans.items()}
+
+_current: ContextVar[Optional[Trace]] = ContextVar('trace', default=None)
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    """Collect the spans of the enclosed code (and of ``bind``-wrapped work) into a new Trace."""
+    current = Trace()
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+def observe(stage: str, seconds: float):
+    """Record a stage duration measured elsewhere."""
+    metrics.histogram(STAGE_METRIC, STAGE_HELP, stage=stage).observe(seconds)
+    current = _current.get()
+    if current is not None:
+        current.add(stage, seconds)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s took %.1f ms", stage, seconds * 1000)
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+def bind(function: Callable) -> Callable:
+    """Wrap ``function`` to run in the current context (and trace), e.g. on a thread pool."""
+    context = copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
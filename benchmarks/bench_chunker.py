@@ -0,0 +1,74 @@
+"""Benchmark TokenChunker against the previous character/sentence chunker.
+
+Usage: python -m benchmarks.bench_chunker [--sentences 2000 20000 100000]
+
+Both chunkers get the same pre-split synthetic sentences, so only the
+chunking loops are compared. Reports time, chunk count and the duplication
+factor (characters emitted / characters of input).
+"""
+import argparse
+import json
+import random
+import time
+from app.core.chunker import TokenChunker
+
+WORDS = ("retrieval augmented generation index vector query document chunk model "
+         "token embedding search cache latency corpus answer context page").split()
+
+def synthetic_sentences(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(5, 30))).capitalize() + "." for _ in range(count)]
+
+def legacy_chunks(sentences, chunk_size=1000, overlap=100):
+    """The chunking loop DocumentProcessor.chunk_text used before TokenChunker."""
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    for sentence in sentences:
+        sentence_length = len(sentence)
+        if current_length + sentence_length > chunk_size:
+            chunks.append(" ".join(current_chunk))
+            overlap_tokens = current_chunk[-overlap:] if overlap > 0 else []
+            current_chunk = overlap_tokens + [sentence]
+            current_length = sum(len(t) for t in current_chunk)
+        else:
+            current_chunk.append(sentence)
+            current_length += sentence_length
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+    return chunks
+
+def measure(name, chunk, sentences):
+    input_chars = sum(len(sentence) for sentence in sentences)
+    start = time.perf_counter()
+    chunks = chunk(sentences)
+    elapsed = time.perf_counter() - start
+    return {
+        'chunker': name,
+        'sentences': len(sentences),
+        'seconds': round(elapsed, 4),
+        'chunks': len(chunks),
+        'duplication': round(sum(len(c) for c in chunks) / input_chars, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sentences', type=int, nargs='+', default=[2000, 20000, 100000])
+    parser.add_argument('--tokenizer', help="Hugging Face tokenizer name (default: word/punctuation counting)")
+    args = parser.parse_args()
+
+    tokenizer = None
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    chunker = TokenChunker(tokenizer)
+
+    results = []
+    for count in args.sentences:
+        sentences = synthetic_sentences(count)
+        results.append(measure('legacy', legacy_chunks, sentences))
+        results.append(measure('token', lambda s: list(chunker.chunks(s)), sentences))
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
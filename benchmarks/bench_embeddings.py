@@ -0,0 +1,73 @@
+"""Compare embedding backends: parity with fp32 torch, throughput and cold start.
+
+Usage: python -m benchmarks.bench_embeddings [--backends torch torch-int8 onnx onnx-int8]
+                                             [--texts 2000] [--threads 4] [--min-cosine 0.99]
+
+Parity is the cosine similarity between each backend's embeddings and the
+fp32 "torch" backend's for the same texts; the command exits with status 1
+if any backend's minimum falls below --min-cosine. Cold start is measured in
+a fresh interpreter: imports, model load and the first encode call.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+import numpy as np
+from app.core.embeddings import BACKENDS, EmbeddingGenerator
+from benchmarks.bench_chunker import synthetic_sentences
+
+COLD_START = """
+import time
+start = time.perf_counter()
+from app.core.embeddings import EmbeddingGenerator
+EmbeddingGenerator(backend={backend!r}, threads={threads}).generate_embedding("warm up")
+print(time.perf_counter() - start)
+"""
+
+def cold_start(backend: str, threads: int) -> float:
+    output = subprocess.run([sys.executable, "-c", COLD_START.format(backend=backend, threads=threads)],
+                            check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def throughput(generator: EmbeddingGenerator, texts: list, batch_size: int) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        generator.generate_embeddings(texts[i:i + batch_size])
+    return len(texts) / (time.perf_counter() - start)
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--texts', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--min-cosine', type=float, default=0.99)
+    args = parser.parse_args()
+
+    texts = synthetic_sentences(args.texts)
+    reference = EmbeddingGenerator(backend="torch", threads=args.threads).generate_embeddings(texts)
+
+    results = []
+    for backend in args.backends:
+        generator = EmbeddingGenerator(backend=backend, threads=args.threads)
+        generator.generate_embeddings(texts[:args.batch_size])  # Warm up
+        similarity = cosine(np.asarray(generator.generate_embeddings(texts)), np.asarray(reference))
+        results.append({
+            'backend': backend,
+            'threads': args.threads,
+            'cold_start_seconds': round(cold_start(backend, args.threads), 3),
+            'texts_per_second': round(throughput(generator, texts, args.batch_size), 1),
+            'single_text_per_second': round(throughput(generator, texts[:200], 1), 1),
+            'cosine_min': round(float(similarity.min()), 5),
+            'cosine_mean': round(float(similarity.mean()), 5)
+        })
+    print(json.dumps(results, indent=2))
+    if any(result['cosine_min'] < args.min_cosine for result in results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""End-to-end ingest and query benchmark with local stand-ins for the services.
+
+Usage: python -m benchmarks.bench_pipeline [--sizes 10000 100000 1000000] [--queries 200]
+                                           [--embedder fake|real] [--backend torch]
+                                           [--index-type flat] [--output results.json]
+
+Each corpus size runs in its own interpreter so peak RSS is per size. The
+real DocumentIndexer, FAISSClient (in a temporary directory), QueryEngine
+and Flask routes are used; Elasticsearch, Redis and Ollama are replaced by
+the in-memory fakes in ``benchmarks.fakes``, and with ``--embedder fake``
+so is the embedding model. The fake embedder still chunks with the
+model's tokenizer when transformers can load it; otherwise chunks are
+sized in words, which the output reports as ``"chunk_tokens": "words"``.
+Uploads are written to the temporary directory. Corpora and queries are
+generated from fixed seeds, so runs are repeatable.
+
+Per stage the output reports items, seconds, throughput (items/s) and
+p50/p95/p99 latency (ms); query stages also report the median of each
+pipeline span. Numbers from the fakes measure this code, not the services.
+"""
+import argparse
+import io
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+from app import services
+from app.config import EMBEDDING_MODEL
+from app.core.chunker import TokenChunker
+from app.core.document_processor import DocumentProcessor, ensure_sentence_tokenizer
+from app.storage.chunk_store import ChunkStore
+from app.storage.faiss_client import INDEX_TYPES, FAISSClient
+from app.utils import tracing
+from benchmarks.corpus import document_text, queries
+from benchmarks.fakes import FakeElasticsearchClient, FakeEmbeddingGenerator, FakeLLMClient, FakeRedisClient
+
+SENTENCES_PER_DOCUMENT = 400  # About 25 chunks per document
+
+def stage(items: int, seconds: float, latencies: List[float] = None, spans: List[Dict] = None) -> Dict:
+    """Summary of one stage; ``latencies`` are per-operation seconds, ``spans`` per-request traces."""
+    result = {
+        'items': items,
+        'seconds': round(seconds, 3),
+        'throughput': round(items / seconds, 1) if seconds > 0 else None
+    }
+    if latencies:
+        for p in (50, 95, 99):
+            result[f'p{p}_ms'] = round(float(np.percentile(latencies, p)) * 1000, 3)
+    if spans:
+        names = sorted({name for timings in spans for name in timings})
+        result['span_p50_ms'] = {name: round(float(np.median([t[name] for t in spans if name in t])), 3)
+                                 for name in names}
+    return result
+
+def model_tokenizer():
+    """The embedding model's tokenizer, or None if transformers cannot load it."""
+    try:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+    except Exception as e:  # Not installed, or the model is neither cached nor downloadable
+        print(f"Embedding tokenizer unavailable ({e}); chunk sizes are counted in words", file=sys.stderr)
+        return None
+
+def register_services(args, directory: Path):
+    if args.embedder == "fake":
+        tokenizer = model_tokenizer()
+        services.register('embedding_generator', lambda: FakeEmbeddingGenerator(tokenizer=tokenizer))
+    else:
+        from app.core.embeddings import EmbeddingGenerator
+        # No embedding cache: it would turn repeated runs into cache reads
+        services.register('embedding_generator', lambda: EmbeddingGenerator(backend=args.backend))
+    services.register('es_client', FakeElasticsearchClient)
+    services.register('redis_client', FakeRedisClient)
+    services.register('llm_client', lambda: FakeLLMClient(tokens=args.answer_tokens))
+    services.register('chunk_store', lambda: ChunkStore(directory / "chunks.sqlite3"))
+    services.register('faiss_client', lambda: FAISSClient(
+        snapshot_interval=0, index_type=args.index_type,
+        index_path=directory / "faiss_index", wal_path=directory / "faiss_index.wal"))
+
+def bench_chunking(documents: List[str]) -> Dict:
+    processor = DocumentProcessor(TokenChunker(services.embedding_generator().tokenizer))
+    latencies = []
+    chunks = 0
+    for document in documents:
+        start = time.perf_counter()
+        chunks += len(processor.chunk_text(document))
+        latencies.append(time.perf_counter() - start)
+    return {**stage(chunks, sum(latencies), latencies), 'documents': len(documents)}
+
+def bench_ingest(size: int) -> Dict:
+    """Index synthetic documents until the corpus holds ``size`` chunks."""
+    indexer = services.document_indexer()
+    timings: Dict[str, float] = {}
+    latencies = []
+    chunks = 0
+    while chunks < size:
+        content = document_text(SENTENCES_PER_DOCUMENT, seed=len(latencies))
+        start = time.perf_counter()
+        stats = indexer.index_document(f"doc-{len(latencies)}.txt", content)
+        latencies.append(time.perf_counter() - start)
+        chunks += stats['chunks']
+        for name, seconds in stats['timings'].items():
+            timings[name] = timings.get(name, 0.0) + seconds
+
+    start = time.perf_counter()
+    services.faiss_client().snapshot()
+    snapshot_seconds = time.perf_counter() - start
+    return {
+        **stage(chunks, sum(latencies), latencies),
+        'documents': len(latencies),
+        'stages': {name: stage(chunks, seconds) for name, seconds in timings.items()},
+        'snapshot_seconds': round(snapshot_seconds, 3)
+    }
+
+def bench_engine(texts: List[str]) -> Dict:
+    engine = services.query_engine()
+    latencies = []
+    spans = []
+    for text in texts:
+        start = time.perf_counter()
+        with tracing.trace() as trace:
+            engine.query(text)
+        latencies.append(time.perf_counter() - start)
+        spans.append(trace.as_millis())
+    return stage(len(texts), sum(latencies), latencies, spans)
+
+def bench_http_query(client, texts: List[str]) -> Dict:
+    latencies = []
+    spans = []
+    for text in texts:
+        start = time.perf_counter()
+        response = client.post('/api/query', json={'query': text, 'timings': True})
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/query returned {response.status_code}: {response.get_data(as_text=True)}")
+        spans.append(response.get_json()['timings'])
+    return stage(len(texts), sum(latencies), latencies, spans)
+
+def bench_http_upload(client, count: int, timeout: float = 600) -> Dict:
+    """Upload documents through /api/upload and wait for their ingest jobs to finish."""
+    latencies = []
+    chunks = 0
+    for i in range(count):
+        content = document_text(SENTENCES_PER_DOCUMENT, seed=1_000_000 + i).encode('utf-8')
+        start = time.perf_counter()
+        response = client.post('/api/upload', data={'file': (io.BytesIO(content), f"upload-{i}.txt")},
+                               content_type='multipart/form-data')
+        if response.status_code != 202:
+            raise RuntimeError(f"/api/upload returned {response.status_code}: {response.get_data(as_text=True)}")
+        status_url = response.get_json()['status_url']
+        while True:
+            job = client.get(status_url).get_json()
+            if job['status'] in ('done', 'failed'):
+                break
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"Ingest job {job['id']} did not finish within {timeout}s")
+            time.sleep(0.005)
+        if job['status'] == 'failed':
+            raise RuntimeError(f"Ingest job {job['id']} failed: {job['error']}")
+        latencies.append(time.perf_counter() - start)
+        chunks += job['chunks']
+    return {**stage(chunks, sum(latencies), latencies), 'documents': count}
+
+def run_size(args) -> Dict:
+    from run import create_app
+    ensure_sentence_tokenizer()
+    with tempfile.TemporaryDirectory(prefix="bench-pipeline-") as directory:
+        register_services(args, Path(directory))
+        services.warm_up(['embedding_generator'])
+
+        result = {'size': args.size, 'embedder': args.embedder, 'index_type': args.index_type,
+                  'chunk_tokens': "model" if services.embedding_generator().tokenizer is not None else "words"}
+        result['chunk_text'] = bench_chunking(
+            [document_text(SENTENCES_PER_DOCUMENT, seed=seed) for seed in range(args.chunk_documents)])
+        result['ingest'] = bench_ingest(args.size)
+        result['faiss_vectors'] = int(services.faiss_client().index.ntotal)
+
+        texts = queries(args.queries, seed=args.seed)
+        result['query_cold'] = bench_engine(texts)
+        result['query_cached'] = bench_engine(texts)
+
+        app = create_app(warm_up=False)
+        # Keep uploaded files out of the real STORAGE_DIR
+        app.config['UPLOAD_FOLDER'] = Path(directory) / "uploads"
+        app.config['UPLOAD_FOLDER'].mkdir()
+        client = app.test_client()
+        result['http_query'] = bench_http_query(client, queries(args.queries, seed=args.seed + 1))
+        if args.uploads:
+            result['http_upload'] = bench_http_upload(client, args.uploads)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['peak_rss_mb'] = round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help="Corpus sizes in chunks, each run in a separate process")
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)  # One size, in this process
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--uploads', type=int, default=5, help="Documents sent through /api/upload")
+    parser.add_argument('--chunk-documents', type=int, default=50, help="Documents for the chunk_text stage")
+    parser.add_argument('--embedder', choices=("fake", "real"), default="fake")
+    parser.add_argument('--backend', default="torch", help="Embedding backend with --embedder real")
+    parser.add_argument('--index-type', choices=INDEX_TYPES, default="flat")
+    parser.add_argument('--answer-tokens', type=int, default=32, help="Tokens per fake LLM answer")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the query set")
+    parser.add_argument('--output', help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    if args.size is not None:
+        print(json.dumps(run_size(args)))
+        return
+
+    results = []
+    for size in args.sizes:
+        command = [sys.executable, "-m", "benchmarks.bench_pipeline", "--size", str(size),
+                   "--queries", str(args.queries), "--uploads", str(args.uploads),
+                   "--chunk-documents", str(args.chunk_documents), "--embedder", args.embedder,
+                   "--backend", args.backend, "--index-type", args.index_type,
+                   "--answer-tokens", str(args.answer_tokens), "--seed", str(args.seed)]
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+        print(json.dumps(results[-1]), file=sys.stderr)
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        Path(args.output).write_text(report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Check that read-only FAISS clients share the snapshot instead of copying it.
+
+Usage: python -m benchmarks.bench_reader_memory [--sizes 100000 200000 400000]
+                                                [--index-type flat] [--max-private-fraction 0.1]
+
+For each size a writer builds and snapshots an index of random vectors in a
+temporary directory, then a fresh interpreter opens it read-only, runs a few
+searches and reports how much anonymous (private) memory that added. Mapped
+snapshot pages live in the page cache and are shared by every serving
+process, so the private growth should stay a small fraction of the snapshot.
+The command exits with status 1 if it exceeds --max-private-fraction of the
+snapshot size.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+import numpy as np
+from app.storage.faiss_client import FAISSClient
+
+READER = """
+import numpy as np
+from pathlib import Path
+
+def anonymous_mb():
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Anonymous:"):
+                return int(line.split()[1]) / 1024
+
+from app.storage.faiss_client import FAISSClient
+before = anonymous_mb()
+client = FAISSClient(read_only=True, index_type={index_type!r}, index_path=Path({index_path!r}),
+                     wal_path=Path({wal_path!r}))
+for query in np.random.default_rng(1).random((20, client.dimension), dtype='float32'):
+    client.search(query, 10)
+print(anonymous_mb() - before)
+"""
+
+def reader_private_mb(index_type: str, directory: Path) -> float:
+    code = READER.format(index_type=index_type, index_path=str(directory / "faiss_index"),
+                         wal_path=str(directory / "faiss_index.wal"))
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 200000, 400000])
+    parser.add_argument('--index-type', choices=("flat", "hnsw"), default="flat")
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--max-private-fraction', type=float, default=0.1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-reader-") as directory:
+        directory = Path(directory)
+        writer = FAISSClient(snapshot_interval=0, index_type=args.index_type,
+                             index_path=directory / "faiss_index", wal_path=directory / "faiss_index.wal")
+        for size in sorted(args.sizes):
+            while writer.index.ntotal < size:
+                count = min(args.batch_size, size - writer.index.ntotal)
+                ids = np.arange(writer.index.ntotal, writer.index.ntotal + count)
+                writer.add_embeddings(rng.random((count, writer.dimension), dtype='float32'), ids, flush=False)
+            writer.snapshot()
+            snapshot_mb = (directory / "faiss_index").stat().st_size / (1024 * 1024)
+            private_mb = reader_private_mb(args.index_type, directory)
+            results.append({
+                'vectors': size,
+                'index_type': args.index_type,
+                'snapshot_mb': round(snapshot_mb, 1),
+                'reader_private_mb': round(private_mb, 1),
+                'private_fraction': round(private_mb / snapshot_mb, 3)
+            })
+    print(json.dumps(results, indent=2))
+    if any(result['private_fraction'] > args.max_private_fraction for result in results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
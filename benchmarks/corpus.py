@@ -0,0 +1,30 @@
+"""Deterministic synthetic corpora for the benchmarks.
+
+Words are drawn from a fixed pseudo-word vocabulary with a Zipf-like
+distribution, so term statistics (a few very common words, a long tail)
+resemble real text and lexical and vector retrieval both find matches.
+"""
+import itertools
+import random
+from typing import List
+
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "ta", "vo", "shi", "den", "pra", "gol", "ber", "tun", "zel", "qui", "fas")
+
+def vocabulary(size: int = 5000) -> List[str]:
+    words = ("".join(parts) for length in (2, 3, 4) for parts in itertools.product(SYLLABLES, repeat=length))
+    return list(itertools.islice(words, size))
+
+VOCABULARY = vocabulary()
+CUM_WEIGHTS = list(itertools.accumulate(1.0 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=rng.randint(6, 24))).capitalize() + "."
+
+def document_text(sentences: int, seed: int = 0) -> str:
+    """A document of ``sentences`` sentences (about 15 words each)."""
+    rng = random.Random(seed)
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+def queries(count: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=rng.randint(3, 7))) + "?" for _ in range(count)]
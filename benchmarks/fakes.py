@@ -0,0 +1,215 @@
+"""In-process stand-ins for Elasticsearch, Redis, Ollama and the embedding model.
+
+They implement the methods the app calls on the real clients, so the real
+FAISSClient, DocumentIndexer, QueryEngine and routes run unchanged with no
+external services. Fake latencies are optional and off by default.
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from app.storage.redis_client import RedisClient
+
+_WORD = re.compile(r"\w+")
+
+class FakeEmbeddingGenerator:
+    """Deterministic bag-of-words embedder with the EmbeddingGenerator interface.
+
+    Each word maps to a fixed random vector (seeded by the word's hash); a text
+    embeds to the normalized sum of its words, so texts sharing words are
+    close, as with a real model, at a tiny fraction of the cost. Pass the
+    model's ``tokenizer`` to chunk as the app does; without one chunks are
+    sized in words.
+    """
+
+    def __init__(self, dimension: int = 384, latency: float = 0.0, tokenizer=None):
+        self.dimension = dimension
+        self.latency = latency
+        self.tokenizer = tokenizer
+        self.cache = None
+        self.backend = "fake"
+        self.model_name = "fake-bag-of-words"
+        self._rows: Dict[str, int] = {}  # word -> row of self._vectors
+        self._vectors = np.zeros((1024, dimension), dtype='float32')  # Grown by doubling
+        self._lock = threading.Lock()
+
+    @property
+    def model_key(self) -> str:
+        return f"{self.model_name}@{self.backend}"
+
+    def _row(self, word: str) -> int:
+        row = self._rows.get(word)
+        if row is None:
+            with self._lock:
+                row = self._rows.get(word)
+                if row is None:
+                    seed = int.from_bytes(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest(), 'big')
+                    vector = np.random.default_rng(seed).standard_normal(self.dimension).astype('float32')
+                    row = len(self._rows)
+                    if row == len(self._vectors):
+                        self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+                    self._vectors[row] = vector
+                    self._rows[word] = row
+        return row
+
+    def generate_embedding(self, text: str) -> np.ndarray:
+        return self.generate_embeddings([text])[0]
+
+    def generate_embeddings(self, texts: List[str], use_cache: bool = True) -> np.ndarray:
+        if self.latency:
+            time.sleep(self.latency)
+        rows = [[self._row(word) for word in _WORD.findall(text.lower())] for text in texts]
+        vectors = self._vectors
+        embeddings = np.zeros((len(texts), self.dimension), dtype='float32')
+        for i, text_rows in enumerate(rows):
+            if text_rows:
+                embeddings[i] = vectors[text_rows].sum(axis=0)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.where(norms > 0, norms, 1)
+
+class FakeElasticsearchClient:
+    """Keeps chunks in memory and ranks them by the summed IDF of matching terms.
+
+    Posting lists are capped at ``postings_cap`` entries per term to bound
+    memory on million-chunk corpora, so very common terms only match a
+    subset of the chunks that contain them.
+    """
+
+    def __init__(self, latency: float = 0.0, postings_cap: int = 2000):
+        self.latency = latency
+        self.postings_cap = postings_cap
+        self._documents: Dict[str, Dict] = {}
+        self._postings: Dict[str, List[str]] = defaultdict(list)
+        self._document_frequency: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _add(self, doc_id: str, content: str, metadata: Dict, embedding_id: int):
+        with self._lock:
+            self._documents[doc_id] = {'content': content, 'metadata': metadata, 'embedding_id': embedding_id}
+            for term in set(_WORD.findall(content.lower())):
+                self._document_frequency[term] += 1
+                postings = self._postings[term]
+                if len(postings) < self.postings_cap:
+                    postings.append(doc_id)
+
+    def index_document(self, doc_id, content, metadata, embedding_id):
+        self._add(str(doc_id), content, metadata, embedding_id)
+
+    def bulk_index_documents(self, documents: Iterable[Dict], batch_size: int = 500) -> int:
+        count = 0
+        for document in documents:
+            self._add(str(document['doc_id']), document['content'], document['metadata'], document['embedding_id'])
+            count += 1
+        return count
+
+    def search(self, query: str, filter_: Dict = None, size: int = 10) -> List[Dict]:
+        if self.latency:
+            time.sleep(self.latency)
+        total = max(len(self._documents), 1)
+        scores: Counter = Counter()
+        with self._lock:
+            for term in set(_WORD.findall(query.lower())):
+                frequency = self._document_frequency.get(term, 0)
+                if not frequency:
+                    continue
+                idf = math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+                for doc_id in self._postings[term]:
+                    scores[doc_id] += idf
+            return [self._hit(doc_id, score) for doc_id, score in scores.most_common(size)
+                    if doc_id in self._documents]
+
+    def _hit(self, doc_id: str, score: Optional[float] = None) -> Dict:
+        return {'_id': doc_id, '_score': score, '_source': self._documents[doc_id], 'found': True}
+
+    def delete_documents(self, embedding_ids: Iterable[int], batch_size: int = 500) -> int:
+        with self._lock:
+            return sum(self._documents.pop(str(embedding_id), None) is not None for embedding_id in embedding_ids)
+
+    def get_documents(self, embedding_ids: List[int]) -> List[Dict]:
+        with self._lock:
+            return [self._hit(str(i)) for i in embedding_ids if str(i) in self._documents]
+
+    def get_document(self, doc_id: str) -> Dict:
+        return self._hit(str(doc_id))
+
+    def delete_document(self, doc_id: str):
+        self.delete_documents([doc_id])
+
+class _UnavailableRedis:
+    """Stands in for the raw redis connection; the ingest queue falls back to memory."""
+
+    def __getattr__(self, name):
+        def unavailable(*args, **kwargs):
+            raise ConnectionError("No Redis in benchmarks")
+        return unavailable
+
+class FakeRedisClient(RedisClient):
+    """RedisClient over an in-memory dict (values still go through msgpack/zlib)."""
+
+    def __init__(self):
+        self.redis = _UnavailableRedis()
+        self._values: Dict[str, bytes] = {}
+        self._sets: Dict[str, set] = defaultdict(set)
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def set_cache(self, key: str, value: Any, expire: int = 0):
+        self._values[key] = self._dumps(value)
+
+    def get_cache(self, key: str) -> Optional[Any]:
+        value = self._values.get(key)
+        return self._loads(value) if value else None
+
+    def publish_index_update(self) -> int:
+        return 0
+
+    def get_corpus_version(self) -> int:
+        return self._version
+
+    def bump_corpus_version(self) -> int:
+        with self._lock:
+            self._version += 1
+            return self._version
+
+    def get_answer(self, query: str, model: str, corpus_version: int) -> Optional[Any]:
+        return self.get_cache(self.answer_key(query, model, corpus_version))
+
+    def set_answer(self, query: str, model: str, corpus_version: int, value: Any,
+                   sources: Iterable[str] = (), expire: int = 0):
+        key = self.answer_key(query, model, corpus_version)
+        self.set_cache(key, value)
+        with self._lock:
+            for source in sources:
+                self._sets[source].add(key)
+
+    def invalidate_source(self, source: str) -> int:
+        with self._lock:
+            keys = self._sets.pop(source, set())
+        return sum(self._values.pop(key, None) is not None for key in keys)
+
+class FakeLLMClient:
+    """OllamaClient stand-in that streams a fixed answer, optionally at a set pace."""
+
+    def __init__(self, tokens: int = 32, first_token_latency: float = 0.0, token_latency: float = 0.0):
+        self.model = "fake-llm"
+        self.tokens = tokens
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+
+    def stream(self, prompt: str) -> Iterable[str]:
+        if self.first_token_latency:
+            time.sleep(self.first_token_latency)
+        for i in range(self.tokens):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            yield f"token{i} "
+
+    def generate(self, prompt: str) -> str:
+        return ''.join(self.stream(prompt))
+
+    def stats(self) -> Dict:
+        return {'model': self.model}
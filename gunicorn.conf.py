@@ -0,0 +1,39 @@
+"""Production server: gunicorn -c gunicorn.conf.py
+
+Runs SERVER_WORKERS processes with SERVER_THREADS request threads each. The
+app (and with it the embedding model) is loaded once in the master before
+forking; each worker then opens the shared FAISS snapshot and the storage
+clients, and exactly one of them becomes the index writer.
+"""
+import logging
+import os
+import shutil
+from app.config import (
+    SERVER_BIND, SERVER_WORKERS, SERVER_THREADS, SERVER_TIMEOUT, WARM_UP_ON_STARTUP, LOG_LEVEL,
+    METRICS_DIR, METRICS_SHARE_INTERVAL
+)
+
+# The model is loaded before fork; keep the tokenizers' thread pool out of it
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+wsgi_app = "run:create_app(multi_process=True)"
+bind = SERVER_BIND
+workers = SERVER_WORKERS
+worker_class = "gthread"
+threads = SERVER_THREADS
+timeout = SERVER_TIMEOUT
+preload_app = True
+
+def on_starting(server):
+    logging.basicConfig(level=LOG_LEVEL)
+    # Metric files of a previous run would be added to this run's totals
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+def post_fork(server, worker):
+    from app import services
+    from app.utils import metrics
+    metrics.enable_multi_process(METRICS_DIR, METRICS_SHARE_INTERVAL)
+    # Inference sessions are not fork-safe: create this worker's own
+    services.embedding_generator().prepare()
+    if WARM_UP_ON_STARTUP:
+        services.warm_up()
@@ -1,18 +1,27 @@
 from flask import Flask
 from app.api.routes import api
-from app.config import UPLOAD_FOLDER
+from app.config import UPLOAD_FOLDER, WARM_UP_ON_STARTUP, LOG_LEVEL
+from app import services
 import logging
 
-def create_app():
+def create_app(warm_up: bool = WARM_UP_ON_STARTUP, multi_process: bool = False):
     app = Flask(__name__, 
                 static_folder='app/static',
                 template_folder='app/templates'
     )
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     app.register_blueprint(api)  # No url_prefix needed now
+    if multi_process:
+        # Called once in the server's master process: load only the model, which
+        # the forked workers share copy-on-write. The index, clients, threads,
+        # ONNX sessions and the writer role are set up in each worker after the fork.
+        services.enable_multi_process()
+        services.warm_up(['embedding_generator'])
+    elif warm_up:
+        services.warm_up()
     return app
 
 if __name__ == '__main__':
-    logging.basicConfig(level=logging.INFO)
+    logging.basicConfig(level=LOG_LEVEL)
     app = create_app()
     app.run(debug=True) 
\ No newline at end of file